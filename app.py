@@ -1,28 +1,38 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 import os
-from streamlit_js_eval import streamlit_js_eval
-import folium
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium
-
-from data_utils import (init_csv_files, load_transactions, load_divisions,
-                        add_transaction, update_transaction,
-                        delete_transaction, add_division, update_division,
-                        delete_division, get_division_list, save_receipt,
+
+# plotly and streamlit_js_eval are imported inside the pages that use them,
+# and the Location Data page (folium) lives in location_page.py, so a worker
+# only loads these once such a page is first shown.
+import perf_utils
+from format_utils import format_currency
+from ui_utils import currency_columns
+
+from data_utils import (migrate_storage, load_transactions,
+                        load_divisions, add_transaction, get_transaction,
+                        count_transactions, get_transactions_page,
+                        update_transaction, delete_transaction, add_division,
+                        update_division, delete_division, get_division_list,
+                        is_image_receipt, receipt_thumbnail,
                         calculate_financials, calculate_division_summary,
                         division_exists, get_division_balance,
-                        get_division_transactions, get_division_stats)
+                        get_division_transactions, get_division_stats,
+                        get_daily_totals, get_top_spenders, get_dashboard_data,
+                        get_recent_transactions)
 
 st.set_page_config(page_title="Finance Management",
                    page_icon="💰",
                    layout="wide",
                    initial_sidebar_state="expanded")
 
-init_csv_files()
+migrate_storage()
+
+TRANSACTION_LOG_PAGE_SIZES = [10, 25, 50, 100]
+
+DIVISION_SUMMARY_AMOUNTS = ("Starting Balance", "Credits Added",
+                            "Total Spent", "Remaining Balance")
 
 ADMIN_PASSWORD = "archbox"
 ADMIN_PASSWORD_SET = bool(ADMIN_PASSWORD)
@@ -39,10 +49,11 @@ if "latitude" not in st.session_state:
     st.session_state.latitude = ""
 if "longitude" not in st.session_state:
     st.session_state.longitude = ""
-
-
-def format_currency(amount):
-    return f"AED {amount:,.2f}"
+if "profile_reruns" not in st.session_state:
+    st.session_state.profile_reruns = False
+if "log_cursors" not in st.session_state:
+    st.session_state.log_cursors = [None]
+    st.session_state.log_view = None
 
 
 def get_location_component():
@@ -65,6 +76,7 @@ def get_location_component():
     return location_js
 
 
+@perf_utils.instrumented(category="render")
 def render_sidebar():
     with st.sidebar:
         st.title("💰 Finance Manager")
@@ -106,6 +118,9 @@ def render_sidebar():
             if st.button("📍 Location Data", use_container_width=True):
                 st.session_state.current_page = "Location Data"
                 st.rerun()
+            if st.button("🩺 Diagnostics", use_container_width=True):
+                st.session_state.current_page = "Diagnostics"
+                st.rerun()
             st.divider()
             if st.button("🚪 Logout",
                          use_container_width=True,
@@ -119,11 +134,15 @@ def render_sidebar():
                 st.rerun()
 
 
+@perf_utils.instrumented(category="render")
 def render_dashboard():
+    import plotly.express as px
+
     st.title("🏠 Finance Dashboard")
     st.markdown("---")
 
-    financials = calculate_financials()
+    dashboard = get_dashboard_data(recent_count=5)
+    financials = dashboard["financials"]
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -152,82 +171,66 @@ def render_dashboard():
     st.markdown("---")
     st.subheader("📊 Division-wise Summary")
 
-    division_summary = calculate_division_summary()
+    division_summary = dashboard["division_summary"]
 
     if division_summary.empty:
         st.info(
             "No divisions have been created yet. An admin needs to add divisions first."
         )
     else:
-        display_summary = division_summary.copy()
-        for col in [
-                "Starting Balance", "Credits Added", "Total Spent",
-                "Remaining Balance"
-        ]:
-            if col in display_summary.columns:
-                display_summary[col] = display_summary[col].apply(
-                    format_currency)
-
-        st.dataframe(display_summary,
+        st.dataframe(division_summary,
                      use_container_width=True,
-                     hide_index=True)
+                     hide_index=True,
+                     column_config=currency_columns(*DIVISION_SUMMARY_AMOUNTS))
 
-        divisions = load_divisions()
-        transactions = load_transactions()
+        col1, col2 = st.columns(2)
 
-        if not divisions.empty:
-            col1, col2 = st.columns(2)
+        with col1:
+            fig = px.pie(division_summary,
+                         values="Remaining Balance",
+                         names="Division",
+                         title="Remaining Balance by Division")
+            fig.update_traces(textposition='inside', textinfo='percent+label')
+            st.plotly_chart(fig, use_container_width=True)
 
-            with col1:
-                summary_data = calculate_division_summary()
-                if not summary_data.empty:
-                    fig = px.pie(summary_data,
-                                 values="Remaining Balance",
-                                 names="Division",
-                                 title="Remaining Balance by Division")
-                    fig.update_traces(textposition='inside',
-                                      textinfo='percent+label')
+        with col2:
+            if dashboard["transaction_count"] > 0:
+                div_spending = dashboard["spending_by_division"]
+                if not div_spending.empty:
+                    fig = px.bar(div_spending,
+                                 x="division",
+                                 y="amount",
+                                 title="Spending by Division (AED)",
+                                 labels={
+                                     "division": "Division",
+                                     "amount": "Amount Spent (AED)"
+                                 })
                     st.plotly_chart(fig, use_container_width=True)
-
-            with col2:
-                if not transactions.empty:
-                    div_spending = transactions[
-                        transactions["type"] == "debit"].groupby(
-                            "division")["amount"].sum().reset_index()
-                    if not div_spending.empty:
-                        fig = px.bar(div_spending,
-                                     x="division",
-                                     y="amount",
-                                     title="Spending by Division (AED)",
-                                     labels={
-                                         "division": "Division",
-                                         "amount": "Amount Spent (AED)"
-                                     })
-                        st.plotly_chart(fig, use_container_width=True)
-                    else:
-                        st.info("No spending recorded yet.")
                 else:
-                    st.info("No transactions recorded yet.")
+                    st.info("No spending recorded yet.")
+            else:
+                st.info("No transactions recorded yet.")
 
     st.markdown("---")
     st.subheader("📋 Last 5 Transactions")
 
-    transactions = load_transactions()
-    if not transactions.empty:
-        recent = transactions.sort_values("datetime", ascending=False)
-        display_df = recent.copy()
-        display_df["amount"] = display_df["amount"].apply(format_currency)
-        st.dataframe(display_df[[
+    recent = dashboard["recent"]
+    if not recent.empty:
+        st.dataframe(recent[[
             "id", "datetime", "name", "division", "type", "amount",
             "description"
         ]],
                      use_container_width=True,
-                     hide_index=True)
+                     hide_index=True,
+                     column_config=currency_columns("amount"))
     else:
         st.info("No transactions recorded yet.")
 
 
+@perf_utils.instrumented(category="render")
 def render_submit_expense():
+    from streamlit_js_eval import streamlit_js_eval
+
     st.title("📝 Submit Expense")
     st.markdown(
         "Submit a new expense request. This will be recorded as a debit transaction."
@@ -316,20 +319,20 @@ def render_submit_expense():
             elif amount <= 0:
                 st.error("Amount must be greater than zero.")
             else:
-                receipt_path = ""
-                if receipt:
-                    receipt_path = save_receipt(receipt)
-
-                trans_id = add_transaction(name=student_name,
-                                           student_class=student_class,
-                                           division=division,
-                                           trans_type="debit",
-                                           amount=amount,
-                                           description=description,
-                                           receipt_path=receipt_path,
-                                           validate_balance=True,
-                                           latitude=latitude,
-                                           longitude=longitude)
+                try:
+                    trans_id = add_transaction(name=student_name,
+                                               student_class=student_class,
+                                               division=division,
+                                               trans_type="debit",
+                                               amount=amount,
+                                               description=description,
+                                               validate_balance=True,
+                                               latitude=latitude,
+                                               longitude=longitude,
+                                               receipt_upload=receipt)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                    return
 
                 if trans_id is None:
                     st.error(
@@ -346,6 +349,7 @@ def render_submit_expense():
                     st.balloons()
 
 
+@perf_utils.instrumented(category="render")
 def render_transaction_log():
     st.title("📋 Transaction Log")
     st.markdown(
@@ -353,13 +357,13 @@ def render_transaction_log():
     )
     st.markdown("---")
 
-    transactions = load_transactions()
+    total_count = count_transactions()
 
-    if transactions.empty:
+    if total_count == 0:
         st.info("No transactions recorded yet.")
         return
 
-    col1, col2, col3, col4, col5 = st.columns(5)
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
 
     with col1:
         type_filter = st.selectbox("Filter by Type",
@@ -370,7 +374,8 @@ def render_transaction_log():
         division_filter = st.selectbox("Filter by Division", divisions)
 
     with col3:
-        students = ["All"] + sorted(transactions["name"].unique().tolist())
+        names = load_transactions(columns=["name"])["name"]
+        students = ["All"] + sorted(names.unique().tolist())
         student_filter = st.selectbox("Filter by Student", students)
 
     with col4:
@@ -380,27 +385,57 @@ def render_transaction_log():
     with col5:
         sort_order = st.selectbox("Sort Order", ["Descending", "Ascending"])
 
-    filtered_df = transactions.copy()
-
-    if type_filter != "All":
-        filtered_df = filtered_df[filtered_df["type"] == type_filter]
-
-    if division_filter != "All":
-        filtered_df = filtered_df[filtered_df["division"] == division_filter]
-
-    if student_filter != "All":
-        filtered_df = filtered_df[filtered_df["name"] == student_filter]
-
-    ascending = sort_order == "Ascending"
-    filtered_df = filtered_df.sort_values(by=sort_by, ascending=ascending)
-
+    with col6:
+        page_size = st.selectbox("Rows per Page", TRANSACTION_LOG_PAGE_SIZES)
+
+    filters = {
+        "trans_type": None if type_filter == "All" else type_filter,
+        "division": None if division_filter == "All" else division_filter,
+        "name": None if student_filter == "All" else student_filter
+    }
+
+    # Changing any filter or ordering starts again from the first page.
+    view = (type_filter, division_filter, student_filter, sort_by,
+            sort_order, page_size)
+    if st.session_state.log_view != view:
+        st.session_state.log_view = view
+        st.session_state.log_cursors = [None]
+
+    cursors = st.session_state.log_cursors
+    page, next_cursor = get_transactions_page(
+        page_size=page_size,
+        cursor=cursors[-1],
+        sort_by=sort_by,
+        descending=sort_order == "Descending",
+        **filters)
+    matching_count = count_transactions(**filters)
+
+    first = (len(cursors) - 1) * page_size
     st.markdown(
-        f"**Showing {len(filtered_df)} of {len(transactions)} transactions**")
+        f"**Showing {first + 1 if len(page) else 0}-{first + len(page)} of "
+        f"{matching_count} matching transactions ({total_count} total)**")
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("⬅️ Previous",
+                     disabled=len(cursors) == 1,
+                     use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.markdown(f"Page {len(cursors)} of "
+                    f"{max(1, -(-matching_count // page_size))}")
+    with col3:
+        if st.button("Next ➡️",
+                     disabled=next_cursor is None,
+                     use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
 
     st.markdown("---")
     st.subheader("📄 Transaction Details with Receipts")
 
-    for idx, row in filtered_df.iterrows():
+    for row in page.to_dict("records"):
         with st.container():
             col1, col2 = st.columns([2, 1])
 
@@ -420,11 +455,19 @@ def render_transaction_log():
                 receipt_path = row.get("receipt_path", "")
                 if receipt_path and str(receipt_path).strip(
                 ) and os.path.exists(str(receipt_path)):
-                    if str(receipt_path).lower().endswith(
-                        ('.jpg', '.jpeg', '.png')):
-                        st.image(receipt_path,
-                                 caption="Receipt",
-                                 use_container_width=True)
+                    if is_image_receipt(receipt_path):
+                        # The page shows thumbnails; the full-size photo is
+                        # only sent when asked for.
+                        preview = receipt_thumbnail(receipt_path)
+                        if st.toggle("Full-size receipt",
+                                     key=f"receipt_full_{row['id']}"):
+                            preview = receipt_path
+                        if preview:
+                            st.image(preview,
+                                     caption="Receipt",
+                                     use_container_width=True)
+                        else:
+                            st.caption("🖼️ Receipt preview is being prepared")
                     else:
                         st.markdown(
                             f"📄 **Receipt file:** `{os.path.basename(receipt_path)}`"
@@ -436,7 +479,11 @@ def render_transaction_log():
             st.markdown("---")
 
 
+@perf_utils.instrumented(category="render")
 def render_division_analytics():
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.title("📊 Division Analytics")
     st.markdown("View detailed analytics for each division individually.")
     st.markdown("---")
@@ -537,10 +584,7 @@ def render_division_analytics():
         st.plotly_chart(fig, use_container_width=True)
 
     st.subheader("📅 Transaction Timeline")
-    div_transactions["date"] = pd.to_datetime(
-        div_transactions["datetime"]).dt.date
-    daily = div_transactions.groupby(["date",
-                                      "type"])["amount"].sum().reset_index()
+    daily = get_daily_totals(selected_division)
 
     if not daily.empty:
         fig = px.line(daily,
@@ -558,10 +602,8 @@ def render_division_analytics():
         st.plotly_chart(fig, use_container_width=True)
 
     st.subheader("👥 Top Spenders")
-    debits_df = div_transactions[div_transactions["type"] == "debit"]
-    if not debits_df.empty:
-        top_spenders = debits_df.groupby("name")["amount"].sum().sort_values(
-            ascending=False).head(5).reset_index()
+    top_spenders = get_top_spenders(5, selected_division)
+    if not top_spenders.empty:
         fig = px.bar(top_spenders,
                      x="name",
                      y="amount",
@@ -571,17 +613,19 @@ def render_division_analytics():
         st.plotly_chart(fig, use_container_width=True)
 
     st.subheader("📋 Recent Transactions")
-    recent = div_transactions.sort_values("datetime", ascending=False).head(10)
-    display_df = recent.copy()
-    display_df["amount"] = display_df["amount"].apply(format_currency)
-    st.dataframe(
-        display_df[["id", "datetime", "name", "type", "amount",
-                    "description"]],
-        use_container_width=True,
-        hide_index=True)
+    recent = get_recent_transactions(10, selected_division)
+    st.dataframe(recent[["id", "datetime", "name", "type", "amount",
+                         "description"]],
+                 use_container_width=True,
+                 hide_index=True,
+                 column_config=currency_columns("amount"))
 
 
+@perf_utils.instrumented(category="render")
 def render_stats():
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     st.title("📈 Stats & Analytics")
     st.markdown("Visual insights into financial data.")
     st.markdown("---")
@@ -646,9 +690,7 @@ def render_stats():
             st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("Transaction Timeline")
-        transactions["date"] = pd.to_datetime(transactions["datetime"]).dt.date
-        daily_summary = transactions.groupby(["date", "type"
-                                              ])["amount"].sum().reset_index()
+        daily_summary = get_daily_totals()
 
         if not daily_summary.empty:
             fig = px.line(daily_summary,
@@ -664,8 +706,7 @@ def render_stats():
             st.plotly_chart(fig, use_container_width=True)
 
         st.subheader("Top Spenders")
-        top_spenders = debits.groupby("name")["amount"].sum().sort_values(
-            ascending=False).head(10).reset_index()
+        top_spenders = get_top_spenders(10)
         if not top_spenders.empty:
             fig = px.bar(top_spenders, x="name", y="amount", title="")
             fig.update_layout(xaxis_title="Student",
@@ -696,6 +737,7 @@ def render_stats():
             st.plotly_chart(fig, use_container_width=True)
 
 
+@perf_utils.instrumented(category="render")
 def render_admin_login():
     st.title("🔑 Admin Login")
     st.markdown("Enter the admin password to access management features.")
@@ -729,6 +771,7 @@ def render_admin_login():
                 st.error("❌ Invalid password. Please try again.")
 
 
+@perf_utils.instrumented(category="render")
 def render_admin_dashboard():
     if not st.session_state.is_admin:
         st.error("Access denied. Please login as admin.")
@@ -741,8 +784,7 @@ def render_admin_dashboard():
     st.markdown("---")
 
     financials = calculate_financials()
-    transactions = load_transactions()
-    divisions = load_divisions()
+    divisions = get_division_list()
 
     col1, col2, col3, col4 = st.columns(4)
 
@@ -750,14 +792,12 @@ def render_admin_dashboard():
         st.metric("💰 Total Balance",
                   format_currency(financials["remaining_balance"]))
     with col2:
-        st.metric("📊 Total Transactions", len(transactions))
+        st.metric("📊 Total Transactions", count_transactions())
     with col3:
         st.metric("🏢 Total Divisions", len(divisions))
     with col4:
-        credits = len(transactions[transactions["type"] ==
-                                   "credit"]) if not transactions.empty else 0
-        debits = len(transactions[transactions["type"] ==
-                                  "debit"]) if not transactions.empty else 0
+        credits = count_transactions(trans_type="credit")
+        debits = count_transactions(trans_type="debit")
         st.metric("Credits / Debits", f"{credits} / {debits}")
 
     st.markdown("---")
@@ -796,239 +836,26 @@ def render_admin_dashboard():
     st.markdown("---")
     st.subheader("Recent Transactions")
 
-    if not transactions.empty:
-        recent = transactions.sort_values("datetime", ascending=False).head(5)
-        display_df = recent.copy()
-        display_df["amount"] = display_df["amount"].apply(format_currency)
-        st.dataframe(display_df[[
+    recent = get_recent_transactions(5)
+    if not recent.empty:
+        st.dataframe(recent[[
             "id", "datetime", "name", "division", "type", "amount",
             "description"
         ]],
                      use_container_width=True,
-                     hide_index=True)
+                     hide_index=True,
+                     column_config=currency_columns("amount"))
     else:
         st.info("No transactions yet.")
 
 
+@perf_utils.instrumented(category="render")
 def render_location_data():
-    if not st.session_state.is_admin:
-        st.error("Access denied. Please login as admin.")
-        return
-
-    st.title("📍 Location Data & Fraud Detection (Admin Only)")
-    st.markdown(
-        "View geolocation data and map visualization for fraud prevention.")
-    st.markdown("---")
-
-    st.warning(
-        "⚠️ This data is confidential and should only be used for fraud prevention purposes."
-    )
-
-    transactions = load_transactions()
-
-    if transactions.empty:
-        st.info("No transactions recorded yet.")
-        return
-
-    has_location = transactions[(transactions["latitude"].notna())
-                                & (transactions["latitude"] != "") &
-                                (transactions["longitude"].notna()) &
-                                (transactions["longitude"] != "")]
-
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Total Transactions", len(transactions))
-    with col2:
-        st.metric("With Location Data", len(has_location))
-    with col3:
-        coverage = (len(has_location) / len(transactions) *
-                    100) if len(transactions) > 0 else 0
-        st.metric("Location Coverage", f"{coverage:.1f}%")
-
-    st.markdown("---")
-
-    if not has_location.empty:
-        st.subheader("🗺️ Expense Submission Locations - Street View Map")
-        st.markdown(
-            "Interactive street-level map showing exact locations where expenses were submitted. Zoom in to see streets, buildings, and landmarks for fraud detection."
-        )
-
-        map_df = has_location.copy()
-        map_df["lat"] = pd.to_numeric(map_df["latitude"], errors='coerce')
-        map_df["lon"] = pd.to_numeric(map_df["longitude"], errors='coerce')
-        map_df = map_df.dropna(subset=["lat", "lon"])
-
-        if not map_df.empty:
-            center_lat = map_df["lat"].mean()
-            center_lon = map_df["lon"].mean()
-
-            m = folium.Map(location=[center_lat, center_lon],
-                           zoom_start=12,
-                           tiles='OpenStreetMap')
-
-            marker_cluster = MarkerCluster().add_to(m)
-
-            division_colors = {
-                div: color
-                for div, color in zip(map_df["division"].unique(), [
-                    'red', 'blue', 'green', 'purple', 'orange', 'darkred',
-                    'lightred', 'beige', 'darkblue', 'darkgreen'
-                ])
-            }
-
-            for _, row in map_df.iterrows():
-                popup_html = f"""
-                <div style="font-family: Arial, sans-serif; min-width: 200px;">
-                    <h4 style="margin: 0 0 10px 0; color: #333;">Transaction Details</h4>
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr><td style="padding: 4px 0;"><b>ID:</b></td><td>{row['id']}</td></tr>
-                        <tr><td style="padding: 4px 0;"><b>Student:</b></td><td>{row['name']}</td></tr>
-                        <tr><td style="padding: 4px 0;"><b>Class:</b></td><td>{row['class']}</td></tr>
-                        <tr><td style="padding: 4px 0;"><b>Division:</b></td><td>{row['division']}</td></tr>
-                        <tr><td style="padding: 4px 0;"><b>Amount:</b></td><td>{format_currency(row['amount'])}</td></tr>
-                        <tr><td style="padding: 4px 0;"><b>Date:</b></td><td>{row['datetime']}</td></tr>
-                        <tr><td style="padding: 4px 0;"><b>Coordinates:</b></td><td>{row['lat']:.6f}, {row['lon']:.6f}</td></tr>
-                    </table>
-                    <div style="margin-top: 10px;">
-                        <a href="https://www.google.com/maps?q={row['lat']},{row['lon']}" target="_blank" 
-                           style="background: #4285f4; color: white; padding: 6px 12px; text-decoration: none; border-radius: 4px; display: inline-block;">
-                           View on Google Maps
-                        </a>
-                    </div>
-                </div>
-                """
-
-                color = division_colors.get(row['division'], 'gray')
-
-                folium.Marker(
-                    location=[row['lat'], row['lon']],
-                    popup=folium.Popup(popup_html, max_width=300),
-                    tooltip=f"{row['name']} - {format_currency(row['amount'])}",
-                    icon=folium.Icon(color=color, icon='money',
-                                     prefix='fa')).add_to(marker_cluster)
-
-            legend_html = """
-            <div style="position: fixed; bottom: 50px; left: 50px; z-index: 1000; background: white; 
-                        padding: 10px; border-radius: 5px; border: 2px solid gray; font-size: 12px;">
-                <b>Division Colors:</b><br>
-            """
-            for div, color in division_colors.items():
-                legend_html += f'<i class="fa fa-map-marker" style="color:{color}"></i> {div}<br>'
-            legend_html += "</div>"
-            m.get_root().html.add_child(folium.Element(legend_html))
-
-            st_folium(m, width=None, height=500, use_container_width=True)
-
-            st.markdown("---")
-            st.subheader("📊 Location Analysis")
-
-            col1, col2 = st.columns(2)
-
-            with col1:
-                st.markdown("**Submissions by Division (with location)**")
-                div_counts = map_df.groupby("division").size().reset_index(
-                    name="count")
-                fig_div = px.pie(div_counts,
-                                 values="count",
-                                 names="division",
-                                 title="Distribution by Division")
-                st.plotly_chart(fig_div, use_container_width=True)
-
-            with col2:
-                st.markdown("**Submission Timeline**")
-                map_df["date"] = pd.to_datetime(map_df["datetime"]).dt.date
-                daily_counts = map_df.groupby("date").size().reset_index(
-                    name="count")
-                fig_timeline = px.bar(daily_counts,
-                                      x="date",
-                                      y="count",
-                                      title="Daily Submissions with Location")
-                fig_timeline.update_layout(xaxis_title="Date",
-                                           yaxis_title="Count")
-                st.plotly_chart(fig_timeline, use_container_width=True)
-
-            st.markdown("---")
-            st.subheader("🔍 Cluster Detection")
-            st.markdown(
-                "Transactions from similar locations may indicate coordinated submissions."
-            )
-
-            unique_locations = map_df.groupby(["lat", "lon"]).agg({
-                "id":
-                "count",
-                "name":
-                lambda x: ", ".join(x.unique()[:3]) +
-                ("..." if len(x.unique()) > 3 else ""),
-                "amount":
-                "sum"
-            }).reset_index()
-            unique_locations.columns = [
-                "Latitude", "Longitude", "Transaction Count", "Students",
-                "Total Amount"
-            ]
-            unique_locations["Total Amount"] = unique_locations[
-                "Total Amount"].apply(format_currency)
-            unique_locations = unique_locations.sort_values(
-                "Transaction Count", ascending=False)
-
-            if len(unique_locations) > 0:
-                st.dataframe(unique_locations,
-                             use_container_width=True,
-                             hide_index=True)
-        else:
-            st.info("Location data could not be parsed for mapping.")
-
-    st.markdown("---")
-    st.subheader("📋 All Transactions with Location Data")
-
-    if has_location.empty:
-        st.info("No transactions have location data yet.")
-    else:
-        display_df = has_location.copy()
-        display_df["amount"] = display_df["amount"].apply(format_currency)
-        display_df["coordinates"] = display_df.apply(
-            lambda x: f"{x['latitude']}, {x['longitude']}"
-            if x['latitude'] and x['longitude'] else "N/A",
-            axis=1)
-
-        st.dataframe(display_df[[
-            "id", "datetime", "name", "division", "amount", "latitude",
-            "longitude", "coordinates"
-        ]],
-                     use_container_width=True,
-                     hide_index=True)
-
-    st.markdown("---")
-    st.subheader("🔍 Search by Transaction ID")
-
-    trans_ids = transactions["id"].tolist()
-    selected_id = st.selectbox("Select Transaction", trans_ids)
-
-    if selected_id:
-        trans = transactions[transactions["id"] == selected_id].iloc[0]
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown(f"**Transaction ID:** {trans['id']}")
-            st.markdown(f"**Student:** {trans['name']}")
-            st.markdown(f"**Class:** {trans['class']}")
-            st.markdown(f"**Division:** {trans['division']}")
-            st.markdown(f"**Amount:** {format_currency(trans['amount'])}")
-
-        with col2:
-            st.markdown(f"**Date/Time:** {trans['datetime']}")
-            lat = trans.get('latitude', '')
-            lon = trans.get('longitude', '')
-            if lat and lon and str(lat).strip() and str(lon).strip():
-                st.markdown(f"**Latitude:** {lat}")
-                st.markdown(f"**Longitude:** {lon}")
-                st.markdown(
-                    f"[View on Google Maps](https://www.google.com/maps?q={lat},{lon})"
-                )
-            else:
-                st.markdown("**Location:** Not captured")
+    import location_page
+    location_page.render()
 
 
+@perf_utils.instrumented(category="render")
 def render_manage_transactions():
     if not st.session_state.is_admin:
         st.error("Access denied. Please login as admin.")
@@ -1054,13 +881,13 @@ def render_manage_transactions():
     selected_id = st.selectbox("Select Transaction ID to Edit/Delete",
                                trans_ids)
 
-    if selected_id:
-        trans_row = transactions[transactions["id"] == selected_id].iloc[0]
+    trans_row = get_transaction(selected_id) if selected_id else None
+    if trans_row is not None:
 
         st.markdown("#### Current Location Data (Read Only)")
-        lat = trans_row.get('latitude', '')
-        lon = trans_row.get('longitude', '')
-        if lat and lon and str(lat).strip() and str(lon).strip():
+        lat = trans_row['latitude']
+        lon = trans_row['longitude']
+        if pd.notna(lat) and pd.notna(lon):
             st.info(f"📍 Coordinates: {lat}, {lon}")
         else:
             st.info("📍 No location data captured for this transaction")
@@ -1122,16 +949,16 @@ def render_manage_transactions():
     st.markdown("---")
     st.subheader("All Transactions")
 
-    display_df = transactions.copy()
-    display_df["amount"] = display_df["amount"].apply(format_currency)
-    st.dataframe(display_df[[
+    st.dataframe(transactions[[
         "id", "datetime", "name", "class", "division", "type", "amount",
         "description"
     ]],
                  use_container_width=True,
-                 hide_index=True)
+                 hide_index=True,
+                 column_config=currency_columns("amount"))
 
 
+@perf_utils.instrumented(category="render")
 def render_manage_divisions():
     if not st.session_state.is_admin:
         st.error("Access denied. Please login as admin.")
@@ -1236,19 +1063,14 @@ def render_manage_divisions():
 
         summary = calculate_division_summary()
         if not summary.empty:
-            display_summary = summary.copy()
-            for col in [
-                    "Starting Balance", "Credits Added", "Total Spent",
-                    "Remaining Balance"
-            ]:
-                if col in display_summary.columns:
-                    display_summary[col] = display_summary[col].apply(
-                        format_currency)
-            st.dataframe(display_summary,
-                         use_container_width=True,
-                         hide_index=True)
+            st.dataframe(
+                summary,
+                use_container_width=True,
+                hide_index=True,
+                column_config=currency_columns(*DIVISION_SUMMARY_AMOUNTS))
 
 
+@perf_utils.instrumented(category="render")
 def render_add_credit_expense():
     if not st.session_state.is_admin:
         st.error("Access denied. Please login as admin.")
@@ -1360,18 +1182,19 @@ def render_add_credit_expense():
                 elif expense_amount <= 0:
                     st.error("Amount must be greater than zero.")
                 else:
-                    receipt_path = ""
-                    if expense_receipt:
-                        receipt_path = save_receipt(expense_receipt)
-
-                    trans_id = add_transaction(name=expense_name,
-                                               student_class=expense_class,
-                                               division=selected_div,
-                                               trans_type="debit",
-                                               amount=expense_amount,
-                                               description=expense_desc,
-                                               receipt_path=receipt_path,
-                                               validate_balance=False)
+                    try:
+                        trans_id = add_transaction(
+                            name=expense_name,
+                            student_class=expense_class,
+                            division=selected_div,
+                            trans_type="debit",
+                            amount=expense_amount,
+                            description=expense_desc,
+                            validate_balance=False,
+                            receipt_upload=expense_receipt)
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                        return
                     if trans_id:
                         st.success(
                             f"✅ Expense of {format_currency(expense_amount)} added to {selected_div}! Transaction ID: {trans_id}"
@@ -1380,35 +1203,208 @@ def render_add_credit_expense():
                         st.error("❌ Failed to add expense.")
 
 
-def main():
-    render_sidebar()
-
-    page = st.session_state.current_page
-
-    if page == "Dashboard":
-        render_dashboard()
-    elif page == "Submit Expense":
-        render_submit_expense()
-    elif page == "Transaction Log":
-        render_transaction_log()
-    elif page == "Stats & Analytics":
-        render_stats()
-    elif page == "Division Analytics":
-        render_division_analytics()
-    elif page == "Admin Login":
-        render_admin_login()
-    elif page == "Admin Dashboard":
-        render_admin_dashboard()
-    elif page == "Manage Transactions":
-        render_manage_transactions()
-    elif page == "Manage Divisions":
-        render_manage_divisions()
-    elif page == "Add Credit/Expense":
-        render_add_credit_expense()
-    elif page == "Location Data":
-        render_location_data()
+@perf_utils.instrumented(category="render")
+def render_diagnostics():
+    if not st.session_state.is_admin:
+        st.error("Access denied. Please login as admin.")
+        return
+
+    st.title("🩺 Diagnostics")
+    st.markdown(
+        "Where reruns spend their time, across all sessions served by this "
+        "app process.")
+    st.markdown("---")
+
+    st.subheader("Page Render Latency")
+    latency = perf_utils.render_latency()
+    if not latency:
+        st.info("No reruns recorded yet.")
+    else:
+        rows = []
+        for page, stats in sorted(latency.items()):
+            quantiles = stats["quantiles"]
+            rows.append({
+                "Page": page,
+                "Reruns": stats["count"],
+                "p50 (ms)": quantiles.get(0.5, 0.0) * 1000,
+                "p95 (ms)": quantiles.get(0.95, 0.0) * 1000,
+                "p99 (ms)": quantiles.get(0.99, 0.0) * 1000,
+                "Mean (ms)": stats["seconds"] / stats["count"] * 1000
+            })
+        st.dataframe(pd.DataFrame(rows),
+                     use_container_width=True,
+                     hide_index=True,
+                     column_config={
+                         col: st.column_config.NumberColumn(format="%.1f")
+                         for col in ("p50 (ms)", "p95 (ms)", "p99 (ms)",
+                                     "Mean (ms)")
+                     })
+
+    st.subheader("Recent Reruns")
+    reruns = perf_utils.recent_reruns()[::-1][:50]
+    if reruns:
+        st.dataframe(pd.DataFrame([{
+            "Started":
+            datetime.fromtimestamp(r["started"]).strftime("%H:%M:%S"),
+            "Page":
+            r["page"],
+            "Time (ms)":
+            round(r["seconds"] * 1000, 1),
+            "Data Calls":
+            sum(f["calls"] for f in r["functions"].values()
+                if f["category"] == "data"),
+            "Bytes Read":
+            r["bytes"]["read"],
+            "Bytes Written":
+            r["bytes"]["written"],
+            "Cache Hits":
+            r["cache"].get("hits", 0),
+            "Cache Misses":
+            r["cache"].get("misses", 0)
+        } for r in reruns]),
+                     use_container_width=True,
+                     hide_index=True)
+
+        labels = [
+            f"{datetime.fromtimestamp(r['started']).strftime('%H:%M:%S')} "
+            f"{r['page']} ({r['seconds'] * 1000:.0f} ms)" for r in reruns
+        ]
+        choice = st.selectbox("Breakdown of rerun",
+                              range(len(reruns)),
+                              format_func=lambda i: labels[i])
+        functions = reruns[choice]["functions"]
+        if functions:
+            st.dataframe(pd.DataFrame([{
+                "Function": name,
+                "Category": stats["category"],
+                "Calls": stats["calls"],
+                "Time (ms)": round(stats["seconds"] * 1000, 2)
+            } for name, stats in functions.items()]).sort_values(
+                "Time (ms)", ascending=False),
+                         use_container_width=True,
+                         hide_index=True)
+
+    st.subheader("Since Start")
+    io = perf_utils.io_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Bytes Read", f"{io['bytes']['read']:,}")
+    with col2:
+        st.metric("Bytes Written", f"{io['bytes']['written']:,}")
+    with col3:
+        st.metric("Cache Hits", io["cache"].get("hits", 0))
+    with col4:
+        st.metric("Cache Misses", io["cache"].get("misses", 0))
+
+    functions = perf_utils.function_stats()
+    if functions:
+        st.dataframe(pd.DataFrame([{
+            "Function": name,
+            "Category": stats["category"],
+            "Calls": stats["calls"],
+            "Total (ms)": round(stats["seconds"] * 1000, 1),
+            "Mean (ms)": round(stats["seconds"] / stats["calls"] * 1000, 3),
+            "Max (ms)": round(stats["max_seconds"] * 1000, 1)
+        } for name, stats in functions.items()]).sort_values(
+            "Total (ms)", ascending=False),
+                     use_container_width=True,
+                     hide_index=True)
+
+    st.download_button("⬇️ Download Prometheus metrics",
+                       perf_utils.prometheus_text(),
+                       file_name="metrics.prom",
+                       mime="text/plain")
+    if perf_utils.METRICS_FILE:
+        st.caption(f"Also written to `{perf_utils.METRICS_FILE}` at most "
+                   f"every {perf_utils.METRICS_DUMP_INTERVAL} seconds.")
+
+    st.markdown("---")
+    st.subheader("Profiling")
+    st.markdown(
+        "Profiles record where a page rerun spends its time as sampled "
+        "call stacks. Open the files in https://www.speedscope.app or "
+        "feed them to flamegraph.pl.")
+    st.session_state.profile_reruns = st.checkbox(
+        "Profile my page reruns", value=st.session_state.profile_reruns)
+
+    profiling_until = perf_utils.profiling_all_until()
+    col1, col2 = st.columns(2)
+    with col1:
+        minutes = st.number_input("Profile all sessions for (minutes)",
+                                  min_value=1,
+                                  max_value=60,
+                                  value=5)
+        if st.button("Start profiling all sessions"):
+            perf_utils.profile_all_sessions(minutes)
+            st.rerun()
+    with col2:
+        if profiling_until is not None:
+            st.info("Profiling all sessions until " +
+                    datetime.fromtimestamp(profiling_until).strftime(
+                        "%H:%M:%S"))
+            if st.button("Stop profiling all sessions"):
+                perf_utils.profile_all_sessions(0)
+                st.rerun()
+
+    profiles = perf_utils.list_profiles()
+    if not profiles:
+        st.info("No profiles recorded yet.")
     else:
-        render_dashboard()
+        st.dataframe(pd.DataFrame([{
+            "Recorded": p["created"],
+            "Page": p["label"],
+            "Duration (ms)": p["duration_ms"],
+            "Size (bytes)": p["size"]
+        } for p in profiles]),
+                     use_container_width=True,
+                     hide_index=True)
+        choice = st.selectbox("Profile",
+                              range(len(profiles)),
+                              format_func=lambda i: profiles[i]["name"])
+        selected = profiles[choice]
+        hotspots = perf_utils.profile_hotspots(selected["path"])
+        if hotspots:
+            st.dataframe(pd.DataFrame(
+                hotspots, columns=["Frame", "Self Samples", "Total Samples"]),
+                         use_container_width=True,
+                         hide_index=True)
+        with open(selected["path"], "rb") as f:
+            st.download_button("⬇️ Download profile",
+                               f.read(),
+                               file_name=selected["name"],
+                               mime="text/plain")
+
+
+PAGE_RENDERERS = {
+    "Dashboard": render_dashboard,
+    "Submit Expense": render_submit_expense,
+    "Transaction Log": render_transaction_log,
+    "Stats & Analytics": render_stats,
+    "Division Analytics": render_division_analytics,
+    "Admin Login": render_admin_login,
+    "Admin Dashboard": render_admin_dashboard,
+    "Manage Transactions": render_manage_transactions,
+    "Manage Divisions": render_manage_divisions,
+    "Add Credit/Expense": render_add_credit_expense,
+    "Location Data": render_location_data,
+    "Diagnostics": render_diagnostics
+}
+
+
+def main():
+    with perf_utils.rerun(st.session_state.current_page) as rerun:
+        render_sidebar()
+
+        page = st.session_state.current_page
+        rerun["page"] = page
+        render = PAGE_RENDERERS.get(page, render_dashboard)
+
+        if (st.session_state.profile_reruns
+                or perf_utils.profiling_all_until() is not None):
+            with perf_utils.profiled(page):
+                render()
+        else:
+            render()
 
 
 if __name__ == "__main__":
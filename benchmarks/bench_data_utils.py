@@ -0,0 +1,302 @@
+"""Time the public data_utils functions against synthetic ledgers.
+
+For every requested ledger size a fresh ledger is generated in a temporary
+directory (debits and credits spread over many divisions, a fraction of them
+geotagged) and each function is called repeatedly in its own process, so
+caches and peak memory do not carry over between sizes. Results are latency
+percentiles per function plus peak memory, written as JSON:
+
+    python benchmarks/bench_data_utils.py --sizes 1000 10000 --output run.json
+
+Pass --baseline with an earlier run's JSON to compare medians; the script
+lists every function whose median got slower than the tolerance allows and
+exits with status 1 if there are any. --backend sqlite runs the same suite
+against the SQLite storage backend.
+
+load_transactions is timed on a warm cache, after clearing the cache, and
+right after an add and after an update (the write itself untimed), since
+that is when the cached ledger is caught up from the journal.
+
+benchmarks/baseline_data_utils.json is the committed baseline for the default
+sizes. Refresh it after an intended performance change with
+
+    python benchmarks/bench_data_utils.py --output benchmarks/baseline_data_utils.json
+
+and commit it together with that change.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+PERCENTILES = (50, 90, 99)
+
+
+def _default_divisions(rows):
+    # 10 divisions for small ledgers, growing to 500 at a million rows.
+    return int(min(500, max(10, rows // 2000)))
+
+
+def generate_ledger(rows, divisions, geo_fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    division_names = [f"Division {i:03d}" for i in range(divisions)]
+    start = pd.Timestamp("2025-09-01").value // 10**9
+    seconds = np.sort(rng.integers(start, start + 270 * 86400, rows))
+    geotagged = rng.random(rows) < geo_fraction
+    transactions = pd.DataFrame({
+        "id": [f"{i:08X}" for i in range(rows)],
+        "datetime":
+        pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d %H:%M:%S"),
+        "name": [f"Student {i}" for i in rng.integers(0, 2000, rows)],
+        "class":
+        rng.integers(6, 13, rows).astype(str),
+        "division":
+        np.array(division_names)[rng.integers(0, divisions, rows)],
+        "type":
+        np.where(rng.random(rows) < 0.1, "credit", "debit"),
+        "amount":
+        np.round(rng.random(rows) * 200 + 1, 2),
+        "description":
+        "synthetic",
+        "receipt_path":
+        "",
+        "latitude":
+        np.where(geotagged, 24.3 + rng.random(rows) * 0.3, np.nan),
+        "longitude":
+        np.where(geotagged, 54.3 + rng.random(rows) * 0.3, np.nan)
+    })
+    division_frame = pd.DataFrame({
+        "division": division_names,
+        "starting_balance": 1_000_000.0
+    })
+    return transactions, division_frame
+
+
+def _summarize(samples):
+    samples = np.asarray(samples) * 1000
+    summary = {
+        f"p{p}_ms": round(float(np.percentile(samples, p)), 4)
+        for p in PERCENTILES
+    }
+    summary["mean_ms"] = round(float(samples.mean()), 4)
+    summary["max_ms"] = round(float(samples.max()), 4)
+    summary["calls"] = len(samples)
+    return summary
+
+
+def _measure(call, args_list, before=None):
+    # Latencies of call(*args) for each args, then one extra traced call for
+    # the peak memory it allocates. With before, before(*args) runs untimed
+    # ahead of every call and call takes no arguments.
+    samples = []
+    for args in args_list:
+        if before is not None:
+            before(*args)
+            args = ()
+        started = time.perf_counter()
+        call(*args)
+        samples.append(time.perf_counter() - started)
+    summary = _summarize(samples)
+    args = args_list[-1]
+    if before is not None:
+        before(*args)
+        args = ()
+    tracemalloc.start()
+    try:
+        call(*args)
+        summary["peak_mem_mb"] = round(
+            tracemalloc.get_traced_memory()[1] / 2**20, 3)
+    finally:
+        tracemalloc.stop()
+    return summary
+
+
+def _cold_load():
+    data_utils.clear_ledger_cache()
+    return data_utils.load_transactions()
+
+
+def _run_size(rows, divisions, geo_fraction, calls, cold_calls, backend,
+              queue):
+    workdir = tempfile.mkdtemp(prefix="finance-bench-")
+    try:
+        os.chdir(workdir)
+        data_utils.set_storage_backend(backend)
+        data_utils.migrate_storage()
+        transactions, division_frame = generate_ledger(rows, divisions,
+                                                       geo_fraction)
+        started = time.perf_counter()
+        data_utils.save_divisions(division_frame)
+        data_utils.save_transactions(transactions)
+        setup_seconds = time.perf_counter() - started
+
+        rng = np.random.default_rng(1)
+        names = division_frame["division"].tolist()
+        sampled = [(names[i], ) for i in rng.integers(0, divisions, calls)]
+        ids = transactions["id"].to_numpy()[rng.choice(rows,
+                                                       size=min(
+                                                           rows, 2 * calls),
+                                                       replace=False)]
+        update_args = [(trans_id, "Student 1", "10", names[0], "debit",
+                        12.5, "updated") for trans_id in ids[:calls]]
+        delete_args = [(trans_id, ) for trans_id in ids[calls:]]
+        add_args = [("Bench Student", "10", names[i % divisions], "debit",
+                     5.0, "bench", "", False, "24.45", "54.37")
+                    for i in range(calls)]
+
+        ops = {}
+        ops["load_transactions_cold"] = _measure(_cold_load,
+                                                 [()] * cold_calls)
+        ops["load_transactions"] = _measure(data_utils.load_transactions,
+                                            [()] * calls)
+        ops["get_division_balance"] = _measure(
+            data_utils.get_division_balance, sampled)
+        ops["calculate_financials"] = _measure(
+            data_utils.calculate_financials, [()] * calls)
+        ops["calculate_division_summary"] = _measure(
+            data_utils.calculate_division_summary, [()] * calls)
+        ops["get_division_stats"] = _measure(data_utils.get_division_stats,
+                                             sampled)
+        ops["add_transaction"] = _measure(data_utils.add_transaction,
+                                          add_args)
+        ops["load_transactions_after_add"] = _measure(
+            data_utils.load_transactions, add_args,
+            before=data_utils.add_transaction)
+        ops["update_transaction"] = _measure(data_utils.update_transaction,
+                                             update_args)
+        ops["load_transactions_after_update"] = _measure(
+            data_utils.load_transactions, update_args,
+            before=data_utils.update_transaction)
+        if delete_args:
+            ops["delete_transaction"] = _measure(
+                data_utils.delete_transaction, delete_args)
+
+        queue.put({
+            "rows": rows,
+            "divisions": divisions,
+            "geo_fraction": geo_fraction,
+            "setup_seconds": round(setup_seconds, 3),
+            "peak_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "ops": ops
+        })
+    finally:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(sizes, divisions, geo_fraction, calls, cold_calls, backend):
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for rows in sizes:
+        queue = ctx.Queue()
+        worker = ctx.Process(target=_run_size,
+                             args=(rows, divisions or _default_divisions(rows),
+                                   geo_fraction, calls, cold_calls, backend,
+                                   queue))
+        worker.start()
+        result = queue.get()
+        worker.join()
+        results[str(rows)] = result
+        print(f"{rows:>9} rows, {result['divisions']} divisions "
+              f"(setup {result['setup_seconds']:.1f}s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB)")
+        for name, stats in result["ops"].items():
+            print(f"    {name:<32} p50 {stats['p50_ms']:>9.3f} ms  "
+                  f"p99 {stats['p99_ms']:>9.3f} ms  "
+                  f"peak {stats['peak_mem_mb']:>8.2f} MB")
+    return {
+        "meta": {
+            "backend": backend,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "calls": calls,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    # Functions whose median is more than tolerance (a fraction) and
+    # min_delta_ms slower than in baseline.
+    regressions = []
+    for size, result in report["results"].items():
+        base_ops = baseline.get("results", {}).get(size, {}).get("ops", {})
+        for name, stats in result["ops"].items():
+            base = base_ops.get(name)
+            if base is None:
+                continue
+            new_ms, old_ms = stats["p50_ms"], base["p50_ms"]
+            if (new_ms > old_ms * (1 + tolerance)
+                    and new_ms - old_ms > min_delta_ms):
+                regressions.append({
+                    "rows": int(size),
+                    "function": name,
+                    "baseline_p50_ms": old_ms,
+                    "p50_ms": new_ms,
+                    "ratio": round(new_ms / old_ms, 2) if old_ms else None
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--divisions", type=int, default=None,
+                        help="divisions per ledger (default scales with "
+                        "size from 10 to 500)")
+    parser.add_argument("--geo-fraction", type=float, default=0.3)
+    parser.add_argument("--calls", type=int, default=50,
+                        help="timed calls per function")
+    parser.add_argument("--cold-calls", type=int, default=5,
+                        help="timed loads after clearing the ledger cache")
+    parser.add_argument("--backend", default="csv",
+                        choices=["csv"] + sorted(data_utils.STORAGE_BACKENDS))
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed median slowdown as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5,
+                        help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.divisions, args.geo_fraction, args.calls,
+                 args.cold_calls, args.backend)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance,
+                              args.min_delta_ms)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION: {r['function']} at {r['rows']} rows: "
+                  f"p50 {r['baseline_p50_ms']:.3f} -> {r['p50_ms']:.3f} ms")
+        if not regressions:
+            print("no regressions against baseline")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
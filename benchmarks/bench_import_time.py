@@ -0,0 +1,255 @@
+"""Measure import cost at cold start and per page with ``python -X importtime``.
+
+Two things are measured, each in a fresh interpreter so nothing is already
+in sys.modules:
+
+* cold start: ``import streamlit`` on its own (the floor every worker pays)
+  and ``import app``, i.e. what a new Streamlit worker imports before it can
+  render anything;
+* per page: the first rerun of each page under Streamlit's AppTest against a
+  small seeded ledger, counting only the imports made by the rerun itself, the
+  heavy optional modules it pulled in (folium, plotly.express, ...) and the
+  process's peak RSS afterwards.
+
+    python benchmarks/bench_import_time.py --output imports.json
+
+Pass --baseline with an earlier run's JSON to flag imports that got slower
+than the tolerance allows and pages that now load a heavy module they did
+not load before; the script exits with status 1 if there are any.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+APP_FILE = os.path.join(REPO, "app.py")
+PAGES = [
+    "Dashboard", "Submit Expense", "Transaction Log", "Stats & Analytics",
+    "Division Analytics", "Admin Dashboard", "Manage Transactions",
+    "Manage Divisions", "Add Credit/Expense", "Location Data", "Diagnostics"
+]
+HEAVY_MODULES = [
+    "folium", "streamlit_folium", "plotly.express", "streamlit_js_eval"
+]
+COLD_START = {"streamlit": "import streamlit", "app": "import app"}
+# Written to stderr by the page child right before the rerun, so imports
+# made while setting up AppTest are not charged to the page.
+RERUN_MARKER = "bench-import-time: rerun"
+
+
+def parse_importtime(stderr, after=None):
+    # Cumulative microseconds of each top-level import in -X importtime
+    # output ("import time: self | cumulative | name", nested imports are
+    # indented under their parent), optionally only after a marker line.
+    lines = stderr.splitlines()
+    if after is not None:
+        lines = lines[lines.index(after) + 1:] if after in lines else []
+    imports = {}
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit() or name[1:2] == " ":
+            continue
+        name = name.strip()
+        imports[name] = imports.get(name, 0) + int(cumulative)
+    return imports
+
+
+def _summarize(imports, top):
+    ranked = sorted(imports.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "import_ms": round(sum(imports.values()) / 1000, 1),
+        "modules": len(imports),
+        "top": {name: round(us / 1000, 1)
+                for name, us in ranked[:top]}
+    }
+
+
+def cold_start(workdir, top):
+    # app.py only defines the pages on import (main() runs under
+    # __main__), but data_utils migrates the storage in the working
+    # directory, hence the scratch workdir.
+    results = {}
+    env = dict(os.environ, PYTHONPATH=REPO)
+    for label, statement in COLD_START.items():
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                               statement],
+                              cwd=workdir,
+                              env=env,
+                              capture_output=True,
+                              text=True,
+                              check=True)
+        wall = time.perf_counter() - started
+        results[label] = _summarize(parse_importtime(proc.stderr), top)
+        results[label]["wall_ms"] = round(wall * 1000, 1)
+    return results
+
+
+def _page_child(page, workdir):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(workdir)
+    at = AppTest.from_file(APP_FILE, default_timeout=300)
+    at.session_state["current_page"] = page
+    at.session_state["is_admin"] = True
+    print(RERUN_MARKER, file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "first_rerun_ms": round(elapsed * 1000, 1),
+        "heavy_modules": [m for m in HEAVY_MODULES if m in sys.modules],
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "error": str(at.exception[0].value) if at.exception else None
+    }))
+
+
+def page_imports(page, workdir, top):
+    proc = subprocess.run([
+        sys.executable, "-X", "importtime",
+        os.path.abspath(__file__), "--page-child", page, workdir
+    ],
+                          capture_output=True,
+                          text=True)
+    if proc.returncode != 0:
+        raise SystemExit(f"{page}: {proc.stderr.strip().splitlines()[-1]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result.pop("error"):
+        raise SystemExit(f"{page}: rerun raised an exception")
+    result.update(
+        _summarize(parse_importtime(proc.stderr, after=RERUN_MARKER), top))
+    return result
+
+
+def _seed(workdir, rows):
+    import data_utils
+    from bench_data_utils import _default_divisions, generate_ledger
+
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        data_utils.migrate_storage()
+        transactions, division_frame = generate_ledger(
+            rows, _default_divisions(rows), geo_fraction=0.3)
+        data_utils.save_divisions(division_frame)
+        data_utils.save_transactions(transactions)
+    finally:
+        os.chdir(cwd)
+
+
+def run(pages, rows, top):
+    workdir = tempfile.mkdtemp(prefix="finance-imports-")
+    try:
+        cold = cold_start(workdir, top)
+        for label, stats in cold.items():
+            print(f"{'import ' + label:<24} {stats['import_ms']:>8.1f} ms  "
+                  f"({stats['modules']} top-level modules)")
+        _seed(workdir, rows)
+        results = {}
+        for page in pages:
+            stats = page_imports(page, workdir, top)
+            results[page] = stats
+            heavy = ", ".join(stats["heavy_modules"]) or "-"
+            print(f"    {page:<22} imports {stats['import_ms']:>7.1f} ms  "
+                  f"first rerun {stats['first_rerun_ms']:>7.1f} ms  "
+                  f"RSS {stats['peak_rss_mb']:>6.0f} MB  heavy: {heavy}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "rows": rows,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "cold_start": cold,
+        "pages": results
+    }
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    # Imports more than tolerance (a fraction) and min_delta_ms slower than
+    # in baseline, and pages that load a heavy module they did not before.
+    regressions = []
+    sections = [("cold start", report["cold_start"],
+                 baseline.get("cold_start", {})),
+                ("page", report["pages"], baseline.get("pages", {}))]
+    for kind, current, previous in sections:
+        for name, stats in current.items():
+            base = previous.get(name)
+            if base is None:
+                continue
+            if (stats["import_ms"] > base["import_ms"] * (1 + tolerance)
+                    and stats["import_ms"] - base["import_ms"] > min_delta_ms):
+                regressions.append({
+                    "kind": kind,
+                    "name": name,
+                    "metric": "import_ms",
+                    "baseline": base["import_ms"],
+                    "value": stats["import_ms"]
+                })
+            added = sorted(
+                set(stats.get("heavy_modules", [])) -
+                set(base.get("heavy_modules", [])))
+            if added:
+                regressions.append({
+                    "kind": kind,
+                    "name": name,
+                    "metric": "heavy_modules",
+                    "baseline": base.get("heavy_modules", []),
+                    "value": stats["heavy_modules"]
+                })
+    return regressions
+
+
+def main():
+    if sys.argv[1:2] == ["--page-child"]:
+        _page_child(*sys.argv[2:4])
+        return
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--rows", type=int, default=1_000,
+                        help="ledger size the pages render against")
+    parser.add_argument("--top", type=int, default=10,
+                        help="slowest top-level imports kept per entry")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed import-time growth as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=50.0,
+                        help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    report = run(args.pages, args.rows, args.top)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance,
+                              args.min_delta_ms)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION: {r['kind']} {r['name']}: "
+                  f"{r['metric']} {r['baseline']} -> {r['value']}")
+        if not regressions:
+            print("no regressions against baseline")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
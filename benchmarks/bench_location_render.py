@@ -0,0 +1,103 @@
+"""Time the Location Data table and popup preparation against row count.
+
+Compares the row-wise formatting the page used to do (``apply`` of
+``format_currency`` per amount, ``apply(axis=1)`` for the coordinates column,
+``map`` for popup fields) with the current path: numeric amounts formatted by
+``st.column_config`` in the browser and the ``format_utils`` column formatters
+for the coordinates and popups. Each path is timed up to and including
+Streamlit's Arrow serialisation of the table, which is what ``st.dataframe``
+sends to the browser.
+
+    python benchmarks/bench_location_render.py --rows 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from streamlit import dataframe_util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from format_utils import (format_currency, format_currency_column,  # noqa: E402
+                          format_decimal_column)
+
+TABLE_COLUMNS = [
+    "id", "datetime", "name", "division", "amount", "latitude", "longitude"
+]
+
+
+def _ledger(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": [f"{i:08X}" for i in range(rows)],
+        "datetime":
+        pd.Timestamp("2026-01-01") +
+        pd.to_timedelta(rng.integers(0, 90 * 86400, rows), unit="s"),
+        "name":
+        pd.Categorical(rng.integers(0, 500, rows).astype(str)),
+        "division":
+        pd.Categorical(rng.choice(["Food", "Decor", "Sports"], rows)),
+        "amount":
+        np.round(rng.random(rows) * 500, 2),
+        "latitude":
+        24.3 + rng.random(rows) * 0.3,
+        "longitude":
+        54.3 + rng.random(rows) * 0.3
+    })
+
+
+def rowwise(df):
+    display_df = df[TABLE_COLUMNS].copy()
+    display_df["amount"] = display_df["amount"].apply(format_currency)
+    display_df["coordinates"] = display_df.apply(
+        lambda x: f"{x['latitude']}, {x['longitude']}", axis=1)
+    popups = ("<b>" + df["id"] + "</b> " + df["amount"].map(format_currency) +
+              " " + df["latitude"].map("{:.6f}".format) + ", " +
+              df["longitude"].map("{:.6f}".format))
+    return dataframe_util.convert_pandas_df_to_arrow_bytes(display_df), popups
+
+
+def vectorized(df):
+    display_df = df[TABLE_COLUMNS].copy()
+    display_df["coordinates"] = (
+        format_decimal_column(display_df["latitude"], 6) + ", " +
+        format_decimal_column(display_df["longitude"], 6))
+    popups = ("<b>" + df["id"] + "</b> " + format_currency_column(
+        df["amount"]) + " " + format_decimal_column(df["latitude"], 6) + ", " +
+              format_decimal_column(df["longitude"], 6))
+    return dataframe_util.convert_pandas_df_to_arrow_bytes(display_df), popups
+
+
+def _best_of(fn, df, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows",
+                        type=int,
+                        nargs="+",
+                        default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'row-wise s':>12} {'vectorized s':>13} "
+          f"{'speedup':>8}")
+    for rows in args.rows:
+        df = _ledger(rows)
+        old = _best_of(rowwise, df, args.repeat)
+        new = _best_of(vectorized, df, args.repeat)
+        print(f"{rows:>10} {old:>12.4f} {new:>13.4f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Render every app.py page headlessly against seeded ledgers.
+
+Each page is driven through Streamlit's AppTest (no browser, no server) on
+synthetic ledgers of increasing size, generated the same way as in
+bench_data_utils.py. For every page and size it records the wall time of each
+rerun, how many times the data_utils load_* functions were called per rerun,
+how many elements the page emitted and their serialised size, i.e. roughly
+what the browser would be sent:
+
+    python benchmarks/bench_pages.py --sizes 1000 10000 --output pages.json
+
+Pass --baseline with an earlier run's JSON to flag pages whose median rerun
+got slower than the tolerance allows or that now call load_* more often; the
+script exits with status 1 if there are any.
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import data_utils  # noqa: E402
+from bench_data_utils import _default_divisions, generate_ledger  # noqa: E402
+
+APP_FILE = os.path.join(REPO, "app.py")
+DEFAULT_SIZES = [100, 1_000, 10_000]
+PAGES = [
+    "Dashboard", "Submit Expense", "Transaction Log", "Stats & Analytics",
+    "Division Analytics", "Admin Dashboard", "Manage Transactions",
+    "Manage Divisions", "Add Credit/Expense", "Location Data"
+]
+
+
+def _count_loads(counts):
+    # Wrap every data_utils load_* function so calls made by the page are
+    # counted; app.py picks the wrappers up when its imports run.
+    for name in dir(data_utils):
+        if name.startswith("load_") and callable(getattr(data_utils, name)):
+            original = getattr(data_utils, name)
+
+            @functools.wraps(original)
+            def counted(*args, _name=name, _original=original, **kwargs):
+                counts[_name] = counts.get(_name, 0) + 1
+                return _original(*args, **kwargs)
+
+            setattr(data_utils, name, counted)
+
+
+def _walk(node):
+    # (elements, payload bytes) of the leaves under an AppTest tree node.
+    children = getattr(node, "children", None)
+    if children:
+        totals = [_walk(child) for child in children.values()]
+        return sum(t[0] for t in totals), sum(t[1] for t in totals)
+    proto = getattr(node, "proto", None)
+    return 1, proto.ByteSize() if proto is not None else 0
+
+
+def _render_page(page, reruns, counts):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_FILE, default_timeout=300)
+    at.session_state["current_page"] = page
+    at.session_state["is_admin"] = True
+    times = []
+    loads = []
+    for _ in range(reruns):
+        counts.clear()
+        started = time.perf_counter()
+        at.run()
+        times.append(time.perf_counter() - started)
+        loads.append(sum(counts.values()))
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].value}")
+    elements, payload = _walk(at._tree)
+    times_ms = np.asarray(times) * 1000
+    return {
+        "first_ms": round(float(times_ms[0]), 2),
+        "p50_ms": round(float(np.percentile(times_ms, 50)), 2),
+        "max_ms": round(float(times_ms.max()), 2),
+        "reruns": reruns,
+        "load_calls": max(loads),
+        "load_calls_by_function": dict(counts),
+        "elements": elements,
+        "payload_bytes": payload
+    }
+
+
+def _run_size(rows, pages, reruns, geo_fraction, backend, queue):
+    workdir = tempfile.mkdtemp(prefix="finance-pages-")
+    try:
+        os.chdir(workdir)
+        data_utils.set_storage_backend(backend)
+        data_utils.migrate_storage()
+        divisions = _default_divisions(rows)
+        transactions, division_frame = generate_ledger(rows, divisions,
+                                                       geo_fraction)
+        data_utils.save_divisions(division_frame)
+        data_utils.save_transactions(transactions)
+
+        counts = {}
+        _count_loads(counts)
+        results = {
+            page: _render_page(page, reruns, counts)
+            for page in pages
+        }
+        queue.put({"rows": rows, "divisions": divisions, "pages": results})
+    except Exception as exc:
+        queue.put({"rows": rows, "error": repr(exc)})
+    finally:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(sizes, pages, reruns, geo_fraction, backend):
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for rows in sizes:
+        queue = ctx.Queue()
+        worker = ctx.Process(target=_run_size,
+                             args=(rows, pages, reruns, geo_fraction, backend,
+                                   queue))
+        worker.start()
+        result = queue.get()
+        worker.join()
+        if "error" in result:
+            raise SystemExit(f"{rows} rows: {result['error']}")
+        results[str(rows)] = result
+        print(f"{rows:>9} rows, {result['divisions']} divisions")
+        for page, stats in result["pages"].items():
+            print(f"    {page:<22} first {stats['first_ms']:>8.1f} ms  "
+                  f"p50 {stats['p50_ms']:>8.1f} ms  "
+                  f"loads {stats['load_calls']:>2}  "
+                  f"elements {stats['elements']:>4}  "
+                  f"payload {stats['payload_bytes'] / 1024:>9.1f} KiB")
+    return {
+        "meta": {
+            "backend": backend,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "reruns": reruns,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+
+def compare(report, baseline, tolerance, min_delta_ms):
+    # Pages whose median rerun is more than tolerance (a fraction) and
+    # min_delta_ms slower than in baseline, or that call load_* more often.
+    regressions = []
+    for size, result in report["results"].items():
+        base_pages = baseline.get("results", {}).get(size,
+                                                     {}).get("pages", {})
+        for page, stats in result["pages"].items():
+            base = base_pages.get(page)
+            if base is None:
+                continue
+            if (stats["p50_ms"] > base["p50_ms"] * (1 + tolerance)
+                    and stats["p50_ms"] - base["p50_ms"] > min_delta_ms):
+                regressions.append({
+                    "rows": int(size),
+                    "page": page,
+                    "metric": "p50_ms",
+                    "baseline": base["p50_ms"],
+                    "value": stats["p50_ms"]
+                })
+            if stats["load_calls"] > base["load_calls"]:
+                regressions.append({
+                    "rows": int(size),
+                    "page": page,
+                    "metric": "load_calls",
+                    "baseline": base["load_calls"],
+                    "value": stats["load_calls"]
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--pages", nargs="+", default=PAGES, choices=PAGES)
+    parser.add_argument("--reruns", type=int, default=5,
+                        help="reruns per page; the first one is cold")
+    parser.add_argument("--geo-fraction", type=float, default=0.3)
+    parser.add_argument("--backend", default="csv",
+                        choices=["csv"] + sorted(data_utils.STORAGE_BACKENDS))
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed median slowdown as a fraction")
+    parser.add_argument("--min-delta-ms", type=float, default=20.0,
+                        help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.pages, args.reruns, args.geo_fraction,
+                 args.backend)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance,
+                              args.min_delta_ms)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION: {r['page']} at {r['rows']} rows: "
+                  f"{r['metric']} {r['baseline']} -> {r['value']}")
+        if not regressions:
+            print("no regressions against baseline")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
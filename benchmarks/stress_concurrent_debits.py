@@ -0,0 +1,160 @@
+"""Hammer one division with concurrent balance-checked debits.
+
+Spawns several processes, each running several threads that submit debits
+through ``add_transaction(validate_balance=True)`` against the same division
+at the same moment. Afterwards the ledger must show exactly as many accepted
+debits as the starting balance allows and a remaining balance that never went
+negative. A second division is hammered alongside; submissions to different
+divisions only share the ledger lock, held for the journal append, so the
+maximum ledger lock wait should stay around one fsync.
+
+    python benchmarks/stress_concurrent_debits.py --processes 4 --threads 8
+
+--seed-rows first fills the ledger with that many synthetic transactions in
+other divisions (as in bench_data_utils.py), so that lock waits can be seen
+against a realistically sized ledger and index.
+
+Exits with status 1 if the division was overdrawn or the ledger and balance
+index disagree.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_utils  # noqa: E402
+from bench_data_utils import _default_divisions, generate_ledger  # noqa: E402
+
+HOT_DIVISION = "Stress Division"
+SIDE_DIVISION = "Side Division"
+
+
+def _submit(division, submissions, amount, results):
+    for i in range(submissions):
+        trans_id = data_utils.add_transaction(name=f"student-{i}",
+                                              student_class="12",
+                                              division=division,
+                                              trans_type="debit",
+                                              amount=amount,
+                                              description="stress",
+                                              validate_balance=True)
+        results.append(trans_id)
+
+
+def _worker(workdir, start, threads, submissions, amount, queue):
+    os.chdir(workdir)
+    start.wait()
+    results = []
+    pool = []
+    for i in range(threads):
+        division = SIDE_DIVISION if i % 4 == 3 else HOT_DIVISION
+        thread = threading.Thread(target=_submit,
+                                  args=(division, submissions, amount,
+                                        results))
+        pool.append(thread)
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    accepted = sum(1 for r in results
+                   if r not in (None, "INSUFFICIENT_FUNDS"))
+    rejected = sum(1 for r in results if r == "INSUFFICIENT_FUNDS")
+    queue.put((accepted, rejected, data_utils.get_lock_stats()))
+
+
+def run(processes, threads, submissions, balance, amount, seed_rows=0,
+        keep=False):
+    workdir = tempfile.mkdtemp(prefix="finance-stress-")
+    os.chdir(workdir)
+    data_utils.migrate_storage()
+    if seed_rows:
+        transactions, division_frame = generate_ledger(
+            seed_rows, _default_divisions(seed_rows), geo_fraction=0.3)
+        data_utils.save_divisions(division_frame)
+        data_utils.save_transactions(transactions)
+    data_utils.add_division(HOT_DIVISION, balance)
+    data_utils.add_division(SIDE_DIVISION, balance)
+
+    ctx = multiprocessing.get_context("spawn")
+    start = ctx.Event()
+    queue = ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker,
+                    args=(workdir, start, threads, submissions, amount,
+                          queue)) for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    started = time.perf_counter()
+    start.set()
+    outcomes = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    accepted = sum(o[0] for o in outcomes)
+    rejected = sum(o[1] for o in outcomes)
+    max_wait = max(
+        o[2].get("division", {}).get("max_wait_seconds", 0.0)
+        for o in outcomes)
+    max_ledger_wait = max(
+        o[2].get("ledger", {}).get("max_wait_seconds", 0.0)
+        for o in outcomes)
+
+    data_utils.clear_ledger_cache()
+    transactions = data_utils.load_transactions()
+    hot = transactions[transactions["division"] == HOT_DIVISION]
+    hot_spent = float(hot["amount"].sum())
+    ledger_balance = balance - hot_spent
+    index_balance = data_utils.get_division_balance(HOT_DIVISION)
+
+    print(f"submissions:       {accepted + rejected} in {elapsed:.2f}s "
+          f"({accepted} accepted, {rejected} rejected)")
+    print(f"hot division:      {len(hot)} debits, balance {ledger_balance:.2f}")
+    print(f"index balance:     {index_balance:.2f}")
+    print(f"max division wait: {max_wait * 1000:.1f} ms")
+    print(f"max ledger wait:   {max_ledger_wait * 1000:.1f} ms")
+
+    failures = []
+    if ledger_balance < 0:
+        failures.append(f"{HOT_DIVISION} overdrawn to {ledger_balance:.2f}")
+    if len(hot) > int(balance // amount):
+        failures.append(f"{len(hot)} debits accepted, at most "
+                        f"{int(balance // amount)} fit the balance")
+    if abs(index_balance - ledger_balance) > 1e-6:
+        failures.append("balance index disagrees with the ledger")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if keep:
+        print(f"ledger kept in {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--submissions", type=int, default=20,
+                        help="debits submitted by each thread")
+    parser.add_argument("--balance", type=float, default=500.0)
+    parser.add_argument("--amount", type=float, default=7.0)
+    parser.add_argument("--seed-rows", type=int, default=0,
+                        help="synthetic transactions to seed the ledger with")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the temporary ledger for inspection")
+    args = parser.parse_args()
+    ok = run(args.processes, args.threads, args.submissions, args.balance,
+             args.amount, seed_rows=args.seed_rows, keep=args.keep)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,1391 @@
+import numpy as np
 import pandas as pd
 import os
+import functools
+import hashlib
+import heapq
+import importlib
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 import uuid
 
+import perf_utils
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    # Without pyarrow every cold load parses transactions.csv.
+    pa = None
+    feather = None
+
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:
+    # Without Pillow no thumbnails are made and receipts show full size.
+    Image = None
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks on this platform; writers are still
+    # serialised within the process.
+    fcntl = None
+
 TRANSACTIONS_FILE = "transactions.csv"
+TRANSACTIONS_JOURNAL_FILE = "transactions.journal"
+TRANSACTIONS_SNAPSHOT_FILE = "transactions.feather"
 DIVISIONS_FILE = "divisions.csv"
+BALANCE_INDEX_FILE = "balance_index.json"
+LEDGER_ROLLUPS_FILE = "ledger_rollups.json"
+# Bumped whenever the layout of balance_index.json or ledger_rollups.json
+# changes; an index in an older layout is rebuilt from the ledger.
+BALANCE_INDEX_FORMAT = 5
+SCHEMA_VERSION_FILE = "schema_version.json"
+LEDGER_LOCK_FILE = ".ledger.lock"
+LOCKS_FOLDER = ".locks"
 RECEIPTS_FOLDER = "receipts"
+RECEIPT_THUMBNAILS_FOLDER = os.path.join(RECEIPTS_FOLDER, "thumbnails")
+RECEIPT_PARTIAL_FOLDER = os.path.join(RECEIPTS_FOLDER, ".partial")
+RECEIPT_MAX_BYTES = 10 * 1024 * 1024
+RECEIPT_CHUNK_BYTES = 256 * 1024
+# Partial uploads older than this belong to a request that died midway.
+RECEIPT_PARTIAL_MAX_AGE = 3600
+RECEIPT_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# Longest edge, in pixels, of the thumbnails made for each image receipt.
+RECEIPT_THUMBNAIL_SIZES = (160, 480)
+RECEIPT_THUMBNAIL_WORKERS = 2
+
+# Once the journal grows past this size it is folded back into
+# transactions.csv by a background compaction.
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+# How many of the newest transactions are kept ready, overall and per
+# division, for the "latest N" views. Larger requests sort the ledger.
+RECENT_TRANSACTIONS_DEPTH = int(os.environ.get("FINANCE_RECENT_DEPTH", "20"))
+
+# "csv" keeps the ledger in the CSV files above; other names are looked up in
+# STORAGE_BACKENDS and forwarded to that module.
+STORAGE_BACKEND = os.environ.get("FINANCE_STORAGE_BACKEND", "csv")
+STORAGE_BACKENDS = {"sqlite": "sqlite_store"}
+
+# Functions a storage backend module must provide. Everything else in this
+# module (id generation, receipts, add_transaction's row building) is shared.
+STORAGE_BACKEND_API = (
+    "migrate_storage", "load_transactions", "save_transactions",
+    "load_divisions", "save_divisions", "reserve_and_commit",
+    "get_transaction", "count_transactions", "get_transactions_page",
+    "update_transaction", "delete_transaction",
+    "add_division", "update_division", "delete_division",
+    "division_exists", "get_division_list", "get_division_balance",
+    "calculate_financials", "calculate_division_summary",
+    "get_division_transactions", "get_division_stats", "get_daily_totals",
+    "get_daily_location_counts", "get_top_spenders", "get_dashboard_data",
+    "get_recent_transactions"
+)
 
 TRANSACTIONS_COLUMNS = ["id", "datetime", "name", "class", "division", "type", "amount", "description", "receipt_path", "latitude", "longitude"]
 DIVISIONS_COLUMNS = ["division", "starting_balance"]
 
+# Columns the balance index, daily rollup and spender totals are rebuilt
+# from.
+BALANCE_INDEX_COLUMNS = ["datetime", "name", "division", "type", "amount",
+                         "latitude", "longitude"]
+
+# Columns get_transactions_page() can order by; ties are broken by id.
+TRANSACTION_SORT_COLUMNS = ("datetime", "amount", "name", "division")
+# Sorted (sort column, id) orders kept per ledger version for paging, one
+# per sort column and filter combination.
+TRANSACTION_PAGE_ORDERS = 4
+
+# Dtypes of the loaded transactions frame, applied once when the ledger is
+# read and also used for the Feather snapshot of transactions.csv. Columns not
+# listed are plain strings. Text columns never hold NaN, only "", and
+# missing coordinates are NaN.
+TRANSACTIONS_DTYPES = {
+    "datetime": "datetime64[ns]",
+    "name": "category",
+    "class": "category",
+    "division": "category",
+    "type": "category",
+    "amount": "float64",
+    "latitude": "float64",
+    "longitude": "float64"
+}
+
+_lock_stats_lock = threading.Lock()
+_lock_stats = {}
+_division_locks = {}
+_compaction_lock = threading.Lock()
+_thumbnail_lock = threading.Lock()
+_thumbnail_executor = None
+_thumbnail_jobs = {}
+_thumbnail_failures = set()
+_compaction_thread = None
+_ledger_indexes = {}
+_index_lock = threading.Lock()
+# Schema version this process migrated the storage to, or None.
+_migrated_version = None
+
+# Parsed ledger shared by every session in the process. The base frame is
+# keyed on the (mtime, size, inode) of transactions.csv; journal records are
+# applied incrementally from the last offset read.
+_cache_lock = threading.RLock()
+_ledger_cache = None
+_divisions_cache = None
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "journal_refreshes": 0,
+    "snapshot_loads": 0,
+    "csv_loads": 0
+}
+
+_backend_modules = {}
+
+
+def get_storage_backend():
+    if STORAGE_BACKEND == "csv":
+        return None
+    module = _backend_modules.get(STORAGE_BACKEND)
+    if module is None:
+        if STORAGE_BACKEND not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND!r}")
+        module = importlib.import_module(STORAGE_BACKENDS[STORAGE_BACKEND])
+        missing = [name for name in STORAGE_BACKEND_API
+                   if not hasattr(module, name)]
+        if missing:
+            raise ImportError(f"Storage backend {STORAGE_BACKEND!r} does not "
+                              f"implement: {', '.join(missing)}")
+        _backend_modules[STORAGE_BACKEND] = module
+    return module
+
+
+def set_storage_backend(name):
+    global STORAGE_BACKEND
+    if name != "csv" and name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name!r}")
+    STORAGE_BACKEND = name
+
+
+def _storage_api(func):
+    # The decorated body is the CSV implementation; any other configured
+    # backend gets the call instead. Calls are timed either way.
+    name = func.__name__
+
+    @functools.wraps(func)
+    def dispatch(*args, **kwargs):
+        backend = get_storage_backend()
+        if backend is None:
+            return func(*args, **kwargs)
+        return getattr(backend, name)(*args, **kwargs)
+
+    return perf_utils.instrumented(dispatch)
+
+
+def _count_cache(event):
+    _cache_stats[event] += 1
+    perf_utils.record_cache(event)
+
+
+def _record_lock_wait(kind, waited, contended):
+    with _lock_stats_lock:
+        stats = _lock_stats.setdefault(kind, {
+            "acquisitions": 0,
+            "contended": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        })
+        stats["acquisitions"] += 1
+        stats["total_wait_seconds"] += waited
+        if contended:
+            stats["contended"] += 1
+        if waited > stats["max_wait_seconds"]:
+            stats["max_wait_seconds"] = waited
+
+
+def get_lock_stats():
+    with _lock_stats_lock:
+        result = {kind: dict(stats) for kind, stats in _lock_stats.items()}
+    for stats in result.values():
+        acquisitions = stats["acquisitions"]
+        stats["avg_wait_seconds"] = (stats["total_wait_seconds"] /
+                                     acquisitions if acquisitions else 0.0)
+    return result
+
+
+class _FileLock:
+    # Re-entrant within a thread, exclusive across threads (RLock) and
+    # across processes (flock on the lock file).
+
+    def __init__(self, path, kind):
+        self.path = path
+        self.kind = kind
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        started = time.perf_counter()
+        contended = not self._lock.acquire(blocking=False)
+        if contended:
+            self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    contended = True
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+            self._fd = fd
+        if self._depth == 0:
+            _record_lock_wait(self.kind, time.perf_counter() - started,
+                              contended)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+_ledger_lock = _FileLock(LEDGER_LOCK_FILE, "ledger")
+
+
+@contextmanager
+def ledger_lock():
+    _ledger_lock.acquire()
+    try:
+        yield
+    finally:
+        _ledger_lock.release()
+
+
+def _get_division_lock(division_name):
+    key = str(division_name)
+    with _lock_stats_lock:
+        lock = _division_locks.get(key)
+        if lock is None:
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            lock = _FileLock(os.path.join(LOCKS_FOLDER, f"division-{digest}.lock"),
+                             "division")
+            _division_locks[key] = lock
+    return lock
+
+
+@contextmanager
+def division_lock(*division_names):
+    # Locks are always taken in sorted order so that writers touching two
+    # divisions (an update moving a transaction) cannot deadlock.
+    Path(LOCKS_FOLDER).mkdir(exist_ok=True)
+    locks = [_get_division_lock(name)
+             for name in sorted({str(name) for name in division_names})]
+    acquired = []
+    try:
+        for lock in locks:
+            lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+
+# The process umask, read once; os.umask can only be read by setting it.
+_UMASK = os.umask(0o022)
+os.umask(_UMASK)
+
+
+def _match_mode(fd, path):
+    # mkstemp creates its file 0600. Give it the mode of the file it will
+    # replace, or the default mode for a new file, so other readers of the
+    # data directory keep access after the rename.
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.fchmod(fd, mode)
+
+
+def _atomic_write(path, write, binary=False):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".",
+                                    suffix=".tmp",
+                                    dir=directory)
+    try:
+        _match_mode(fd, path)
+        if binary:
+            f = os.fdopen(fd, "wb")
+        else:
+            f = os.fdopen(fd, "w", encoding="utf-8", newline="")
+        with f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+            perf_utils.record_bytes("written", os.fstat(f.fileno()).st_size)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory):
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def _write_csv(df, path):
+    _atomic_write(path, lambda f: df.to_csv(f, index=False))
+
+
+def _write_json(obj, path):
+    _atomic_write(path, lambda f: json.dump(obj, f))
+
 
 def ensure_receipts_folder():
     Path(RECEIPTS_FOLDER).mkdir(exist_ok=True)
 
 
-def init_csv_files():
+def _migrate_create_files():
     ensure_receipts_folder()
-    
     if not os.path.exists(TRANSACTIONS_FILE):
-        df = pd.DataFrame(columns=TRANSACTIONS_COLUMNS)
-        df.to_csv(TRANSACTIONS_FILE, index=False)
-    else:
-        df = pd.read_csv(TRANSACTIONS_FILE)
-        if "latitude" not in df.columns:
-            df["latitude"] = ""
-        if "longitude" not in df.columns:
-            df["longitude"] = ""
-        df.to_csv(TRANSACTIONS_FILE, index=False)
-    
+        _write_csv(pd.DataFrame(columns=TRANSACTIONS_COLUMNS),
+                   TRANSACTIONS_FILE)
     if not os.path.exists(DIVISIONS_FILE):
-        df = pd.DataFrame(columns=DIVISIONS_COLUMNS)
-        df.to_csv(DIVISIONS_FILE, index=False)
+        _write_csv(pd.DataFrame(columns=DIVISIONS_COLUMNS), DIVISIONS_FILE)
+
+
+def _migrate_add_location_columns():
+    df = pd.read_csv(TRANSACTIONS_FILE)
+    if "latitude" in df.columns and "longitude" in df.columns:
+        return
+    for col in ["latitude", "longitude"]:
+        if col not in df.columns:
+            df[col] = ""
+    _write_csv(df, TRANSACTIONS_FILE)
+
 
+# Each migration must be safe to re-run on files it has already upgraded,
+# since deployments predating schema_version.json start from version 0.
+MIGRATIONS = [
+    (1, _migrate_create_files),
+    (2, _migrate_add_location_columns),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
 
-def load_transactions():
-    init_csv_files()
+
+def get_schema_version():
     try:
-        df = pd.read_csv(TRANSACTIONS_FILE)
-        if df.empty:
-            return pd.DataFrame(columns=TRANSACTIONS_COLUMNS)
+        with open(SCHEMA_VERSION_FILE, encoding="utf-8") as f:
+            return int(json.load(f)["version"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def _write_schema_version(version):
+    _write_json({"version": version,
+                 "migrated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")},
+                SCHEMA_VERSION_FILE)
+
+
+@_storage_api
+def migrate_storage():
+    # app.py calls this on every rerun, so once the process has migrated it
+    # returns before taking ledger_lock.
+    global _migrated_version
+    if _migrated_version is not None:
+        return _migrated_version
+    with ledger_lock():
+        if _migrated_version is not None:
+            return _migrated_version
+        current = get_schema_version()
+        for version, migration in MIGRATIONS:
+            if version > current:
+                migration()
+                _write_schema_version(version)
+                current = version
+        indexes = _checkpoint_ledger()
+        clear_ledger_cache()
+        _migrated_version = current
+    try:
+        _save_ledger_indexes(indexes)
+    except OSError:
+        # Checkpoints only save a rebuild; reads work without them.
+        pass
+    return current
+
+
+def _checkpoint_ledger():
+    # Reads never write, so the feather snapshot and the index checkpoints
+    # they start from are brought up to date here. Returns the rebuilt
+    # indexes for the caller to checkpoint once ledger_lock is released.
+    signature = _file_signature(TRANSACTIONS_FILE)
+    if not _snapshot_current(signature):
+        _write_snapshot(_read_transactions_file(), signature)
+    position = _index_position()
+    return {
+        section: _rebuild_ledger_index(section)
+        for section in LEDGER_INDEX_SECTIONS
+        if _load_ledger_index(section, *position) is None
+    }
+
+
+def coerce_transaction_dtypes(df):
+    for col in TRANSACTIONS_COLUMNS:
+        if col not in df.columns:
+            continue
+        dtype = TRANSACTIONS_DTYPES.get(col)
+        if dtype in (None, "category") and df[col].hasnans:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.set_categories(
+                    df[col].cat.categories.union([""]))
+            df[col] = df[col].fillna("")
+        if dtype is None or str(df[col].dtype) == dtype:
+            continue
+        if dtype.startswith("datetime64"):
+            df[col] = pd.to_datetime(df[col], format="ISO8601",
+                                     errors="coerce").astype(dtype)
+        elif dtype.startswith("float"):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def _read_transactions_file():
+    text_columns = [col for col in TRANSACTIONS_COLUMNS
+                    if TRANSACTIONS_DTYPES.get(col, "category") == "category"]
+    try:
+        perf_utils.record_bytes("read", os.path.getsize(TRANSACTIONS_FILE))
+        df = pd.read_csv(TRANSACTIONS_FILE,
+                         dtype={col: str for col in text_columns})
         for col in ["latitude", "longitude"]:
             if col not in df.columns:
                 df[col] = ""
-        return df
     except Exception:
-        return pd.DataFrame(columns=TRANSACTIONS_COLUMNS)
+        df = pd.DataFrame(columns=TRANSACTIONS_COLUMNS)
+    return coerce_transaction_dtypes(df)
 
 
+def _snapshot_current(source_signature):
+    if feather is None or source_signature is None:
+        return False
+    try:
+        with pa.memory_map(TRANSACTIONS_SNAPSHOT_FILE) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        return json.loads(metadata.get(b"source_signature",
+                                       b"null")) == source_signature
+    except (OSError, ValueError, pa.ArrowException):
+        return False
+
+
+def _read_snapshot(source_signature, columns=None):
+    if not _snapshot_current(source_signature):
+        return None
+    try:
+        table = feather.read_table(TRANSACTIONS_SNAPSHOT_FILE,
+                                   columns=columns,
+                                   memory_map=True)
+        perf_utils.record_bytes("read", table.nbytes)
+        return table.to_pandas()
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+
+def _write_snapshot(df, source_signature):
+    if feather is None or source_signature is None:
+        return
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"source_signature"] = json.dumps(source_signature).encode()
+        table = table.replace_schema_metadata(metadata)
+        _atomic_write(TRANSACTIONS_SNAPSHOT_FILE,
+                      lambda f: feather.write_feather(table, f),
+                      binary=True)
+    except (OSError, ValueError, pa.ArrowException):
+        # The snapshot is only an accelerator; the CSV stays authoritative.
+        pass
+
+
+def _read_transactions_base(columns=None):
+    signature = _file_signature(TRANSACTIONS_FILE)
+    df = _read_snapshot(signature, columns)
+    if df is not None:
+        _count_cache("snapshot_loads")
+        return signature, df
+    _count_cache("csv_loads")
+    df = _read_transactions_file()
+    if columns is not None:
+        df = df[columns]
+    return signature, df
+
+
+def _new_ledger_cache(base_signature, base, journal_inode):
+    # base_positions maps each transaction id to its row in base (the first
+    # one, should an id ever repeat), so point lookups never scan the frame.
+    ids = base["id"].tolist()
+    return {
+        "base_signature": base_signature,
+        "base": base,
+        "base_positions": dict(zip(reversed(ids),
+                                   range(len(ids) - 1, -1, -1))),
+        "journal_inode": journal_inode,
+        "journal_offset": 0,
+        "added": {},
+        "patches": {},
+        "deleted": set(),
+        # Replayed updates and deletes; while it stays the same, a newly
+        # materialized frame is the previous one plus appended rows.
+        "rewrites": 0,
+        "frame": None,
+        "recent": None,
+        "page_orders": None
+    }
+
+
+def _refresh_from_journal(cache, journal_size, journal_inode):
+    if journal_size > cache["journal_offset"]:
+        records, cache["journal_offset"] = _read_journal(
+            cache["journal_offset"])
+        cache["journal_inode"] = journal_inode
+        if records:
+            _apply_journal_records(cache, records)
+            _apply_recent_records(cache, records)
+            cache["frame"] = None
+    return cache
+
+
+def _materialized(cache):
+    if cache["frame"] is None:
+        cache["frame"] = _materialize_transactions(cache)
+    return cache["frame"]
+
+
+def _journal_state():
+    journal_signature = _file_signature(TRANSACTIONS_JOURNAL_FILE)
+    if journal_signature is None:
+        return 0, None
+    return journal_signature[1], journal_signature[2]
+
+
+def _current_ledger_cache():
+    global _ledger_cache
+    with _cache_lock:
+        base_signature = _file_signature(TRANSACTIONS_FILE)
+        journal_size, journal_inode = _journal_state()
+        cache = _ledger_cache
+
+        stale = (cache is None
+                 or cache["base_signature"] != base_signature
+                 or journal_size < cache["journal_offset"]
+                 or (cache["journal_offset"]
+                     and cache["journal_inode"] != journal_inode))
+        if stale:
+            _count_cache("misses")
+            base_signature, base = _read_transactions_base()
+            cache = _new_ledger_cache(base_signature, base, journal_inode)
+            _ledger_cache = cache
+        elif journal_size > cache["journal_offset"]:
+            _count_cache("journal_refreshes")
+        else:
+            _count_cache("hits")
+
+        return _refresh_from_journal(cache, journal_size, journal_inode)
+
+
+def _cached_transactions():
+    with _cache_lock:
+        return _materialized(_current_ledger_cache())
+
+
+def _lookup_transaction(cache, trans_id):
+    # Constant time: journal-added rows are kept by id, and base rows are
+    # found through base_positions and then patched.
+    row = cache["added"].get(trans_id)
+    if row is not None:
+        return dict(row)
+    position = cache["base_positions"].get(trans_id)
+    if position is None or trans_id in cache["deleted"]:
+        return None
+    row = cache["base"].iloc[position].to_dict()
+    row.update(cache["patches"].get(trans_id, {}))
+    return row
+
+
+def _projected_transactions(columns):
+    # With a warm cache slicing it is cheapest; otherwise read just the
+    # requested columns (plus id, which journal replay needs) from the
+    # snapshot without populating the shared cache.
+    with _cache_lock:
+        if _ledger_cache is not None:
+            return _cached_transactions()[columns]
+        journal_size, journal_inode = _journal_state()
+        needed = list(dict.fromkeys(["id"] + list(columns)))
+        base_signature, base = _read_transactions_base(needed)
+        cache = _new_ledger_cache(base_signature, base, journal_inode)
+        return _materialized(
+            _refresh_from_journal(cache, journal_size, journal_inode))[columns]
+
+
+@_storage_api
+def load_transactions(columns=None):
+    if columns is None:
+        return _cached_transactions().copy()
+    return _projected_transactions(list(columns)).copy()
+
+
+@_storage_api
 def save_transactions(df):
-    df.to_csv(TRANSACTIONS_FILE, index=False)
+    _save_ledger_indexes(_replace_transactions(df))
 
 
-def load_divisions():
-    init_csv_files()
+def _replace_transactions(df):
+    # Returns the rebuilt ledger indexes; the caller checkpoints them with
+    # _save_ledger_indexes() once it has released ledger_lock.
+    with ledger_lock():
+        _write_csv(df, TRANSACTIONS_FILE)
+        _write_snapshot(coerce_transaction_dtypes(df.copy()),
+                        _file_signature(TRANSACTIONS_FILE))
+        _truncate_journal()
+        clear_ledger_cache()
+        return {
+            section: _rebuild_ledger_index(section, transactions=df)
+            for section in LEDGER_INDEX_SECTIONS
+        }
+
+
+@perf_utils.instrumented
+def read_csv_ledger():
+    return _cached_transactions().copy(), _cached_divisions().copy()
+
+
+def clear_ledger_cache():
+    global _ledger_cache, _divisions_cache
+    with _cache_lock:
+        _ledger_cache = None
+        _divisions_cache = None
+
+
+def get_cache_stats():
+    with _cache_lock:
+        return dict(_cache_stats)
+
+
+def _append_journal(record):
+    line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+    with ledger_lock():
+        fd = os.open(TRANSACTIONS_JOURNAL_FILE,
+                     os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            # Start on a fresh line if a crash left a torn record behind.
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                line = b"\n" + line
+            os.write(fd, line)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        perf_utils.record_bytes("written", len(line))
+        journal_size = os.path.getsize(TRANSACTIONS_JOURNAL_FILE)
+    if journal_size >= JOURNAL_COMPACT_BYTES:
+        _schedule_compaction()
+
+
+def _read_journal(offset=0, inode=None):
+    # With inode, nothing is read if the journal was replaced by a
+    # compaction since its inode was taken.
     try:
-        df = pd.read_csv(DIVISIONS_FILE)
+        with open(TRANSACTIONS_JOURNAL_FILE, "rb") as f:
+            if inode is not None and os.fstat(f.fileno()).st_ino != inode:
+                return [], offset
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+    perf_utils.record_bytes("read", len(data))
+
+    # Only consume complete lines; a record still being appended by
+    # another writer is picked up on the next read.
+    complete = data.rfind(b"\n") + 1
+    records = []
+    for line in data[:complete].splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # A torn record left by a crash mid-append.
+            continue
+    return records, offset + complete
+
+
+def _truncate_journal():
+    if os.path.exists(TRANSACTIONS_JOURNAL_FILE):
+        os.remove(TRANSACTIONS_JOURNAL_FILE)
+
+
+def _apply_journal_records(cache, records):
+    # Replay is idempotent: a crash between rewriting transactions.csv and
+    # truncating the journal must not duplicate or resurrect rows.
+    base_positions = cache["base_positions"]
+    added = cache["added"]
+    patches = cache["patches"]
+    deleted = cache["deleted"]
+    for record in records:
+        trans_id = record.get("id")
+        op = record.get("op")
+        if op == "add":
+            if trans_id not in base_positions:
+                added[trans_id] = dict(record["row"])
+            continue
+        cache["rewrites"] += 1
+        if op == "update":
+            if trans_id in added:
+                added[trans_id].update(record["fields"])
+            elif trans_id in base_positions and trans_id not in deleted:
+                patches.setdefault(trans_id, {}).update(record["fields"])
+        elif op == "delete":
+            if trans_id in added:
+                del added[trans_id]
+            elif trans_id in base_positions:
+                deleted.add(trans_id)
+                patches.pop(trans_id, None)
+
+
+def _recent_key(row):
+    # Newest first by (datetime, id); unparseable datetimes sort last.
+    return _row_stamp(row["datetime"]) or "", str(row["id"])
+
+
+def _build_recent(cache):
+    # {None: newest rows overall, division: newest rows of that division},
+    # each newest first and at most RECENT_TRANSACTIONS_DEPTH long.
+    ordered = _materialized(cache).sort_values(["datetime", "id"],
+                                               ascending=False,
+                                               na_position="last")
+    recent = {None: ordered.head(RECENT_TRANSACTIONS_DEPTH).to_dict("records")}
+    per_division = ordered.groupby("division", observed=True,
+                                   sort=False).head(RECENT_TRANSACTIONS_DEPTH)
+    for row in per_division.to_dict("records"):
+        recent.setdefault(str(row["division"]), []).append(row)
+    return recent
+
+
+def _insert_recent(rows, row):
+    if any(str(other["id"]) == str(row["id"]) for other in rows):
+        return
+    key = _recent_key(row)
+    position = len(rows)
+    for i, other in enumerate(rows):
+        if _recent_key(other) < key:
+            position = i
+            break
+    if position < RECENT_TRANSACTIONS_DEPTH:
+        rows.insert(position, row)
+        del rows[RECENT_TRANSACTIONS_DEPTH:]
+
+
+def _apply_recent_records(cache, records):
+    # Keeps the recent buffers in step with replayed journal records. A
+    # row that drops out of a buffer leaves it one short, and only the
+    # ledger knows what comes next, so the buffers are then rebuilt lazily.
+    recent = cache["recent"]
+    if recent is None:
+        return
+    for record in records:
+        trans_id = record.get("id")
+        row = _lookup_transaction(cache, trans_id)
+        emptied = set()
+        if record.get("op") in ("update", "delete"):
+            for scope, rows in recent.items():
+                kept = [other for other in rows
+                        if str(other["id"]) != trans_id]
+                if len(kept) != len(rows):
+                    recent[scope] = kept
+                    emptied.add(scope)
+        if row is not None:
+            for scope in (None, str(row["division"])):
+                rows = recent.setdefault(scope, [])
+                _insert_recent(rows, row)
+                if any(str(other["id"]) == trans_id for other in rows):
+                    emptied.discard(scope)
+        if emptied:
+            cache["recent"] = None
+            return
+
+
+def _recent_transactions(n, division=None):
+    with _cache_lock:
+        cache = _current_ledger_cache()
+        if n > RECENT_TRANSACTIONS_DEPTH:
+            frame = _materialized(cache)
+            if division is not None:
+                frame = frame[frame["division"] == division]
+            return frame.sort_values(["datetime", "id"], ascending=False,
+                                     na_position="last").head(n).reset_index(
+                                         drop=True)
+        if cache["recent"] is None:
+            cache["recent"] = _build_recent(cache)
+        scope = None if division is None else str(division)
+        rows = cache["recent"].get(scope, [])[:n]
+    return coerce_transaction_dtypes(
+        pd.DataFrame(rows, columns=TRANSACTIONS_COLUMNS))
+
+
+def _align_categories(frames):
+    # Give categorical columns identical categories in every frame so that
+    # concatenating them keeps the categorical dtype.
+    frames = [frame.copy() for frame in frames]
+    for col in frames[0].columns:
+        if not isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            continue
+        categories = frames[0][col].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[col].cat.categories)
+        for frame in frames:
+            frame[col] = frame[col].cat.set_categories(categories)
+    return frames
+
+
+def _materialize_transactions(cache):
+    df = cache["base"]
+    deleted = cache["deleted"]
+    patches = cache["patches"]
+    added = cache["added"]
+
+    if deleted:
+        df = df[~df["id"].isin(deleted)]
+    if patches:
+        patched_ids = [trans_id for trans_id in patches
+                       if trans_id in cache["base_positions"]]
+        mask = df["id"].isin(patched_ids)
+        rows = df[mask].to_dict("records")
+        for row in rows:
+            row.update({col: value
+                        for col, value in patches[row["id"]].items()
+                        if col in df.columns})
+        patched = coerce_transaction_dtypes(
+            pd.DataFrame(rows, columns=df.columns, index=df.index[mask]))
+        unchanged, patched = _align_categories([df[~mask], patched])
+        df = pd.concat([unchanged, patched]).sort_index(kind="stable")
+    if added:
+        added_df = coerce_transaction_dtypes(
+            pd.DataFrame(list(added.values()), columns=TRANSACTIONS_COLUMNS)[
+                list(df.columns)])
         if df.empty:
-            return pd.DataFrame(columns=DIVISIONS_COLUMNS)
-        return df
-    except Exception:
-        return pd.DataFrame(columns=DIVISIONS_COLUMNS)
+            df = added_df
+        else:
+            df, added_df = _align_categories([df, added_df])
+            df = pd.concat([df, added_df], ignore_index=True)
+    if df.empty:
+        return coerce_transaction_dtypes(
+            pd.DataFrame(columns=list(cache["base"].columns)))
+    return df.reset_index(drop=True)
+
+
+@perf_utils.instrumented
+def compact_transactions():
+    with ledger_lock():
+        if not os.path.exists(TRANSACTIONS_JOURNAL_FILE):
+            return False
+        indexes = _replace_transactions(_cached_transactions())
+    _save_ledger_indexes(indexes)
+    return True
+
+
+def _schedule_compaction():
+    global _compaction_thread
+    with _compaction_lock:
+        if _compaction_thread is not None and _compaction_thread.is_alive():
+            return
+        _compaction_thread = threading.Thread(target=compact_transactions,
+                                              name="ledger-compaction",
+                                              daemon=True)
+        _compaction_thread.start()
+
+
+def _cached_divisions():
+    global _divisions_cache
+    with _cache_lock:
+        signature = _file_signature(DIVISIONS_FILE)
+        if (_divisions_cache is not None
+                and _divisions_cache["signature"] == signature):
+            _count_cache("hits")
+        else:
+            _count_cache("misses")
+            try:
+                perf_utils.record_bytes("read",
+                                        os.path.getsize(DIVISIONS_FILE))
+                df = pd.read_csv(DIVISIONS_FILE)
+                if df.empty:
+                    df = pd.DataFrame(columns=DIVISIONS_COLUMNS)
+            except Exception:
+                df = pd.DataFrame(columns=DIVISIONS_COLUMNS)
+            _divisions_cache = {"signature": signature, "frame": df}
+        return _divisions_cache["frame"]
+
+
+@_storage_api
+def load_divisions():
+    return _cached_divisions().copy()
 
 
+@_storage_api
 def save_divisions(df):
-    df.to_csv(DIVISIONS_FILE, index=False)
+    _replace_divisions(df)
+
+
+def _replace_divisions(df):
+    global _divisions_cache
+    with ledger_lock():
+        _write_csv(df, DIVISIONS_FILE)
+    with _cache_lock:
+        _divisions_cache = None
 
 
 def generate_transaction_id():
     return str(uuid.uuid4())[:8].upper()
 
 
+@_storage_api
 def division_exists(division_name):
-    df = load_divisions()
+    df = _cached_divisions()
     return division_name in df["division"].values
 
 
-def get_division_balance(division_name):
-    divisions = load_divisions()
-    transactions = load_transactions()
-    
-    div_row = divisions[divisions["division"] == division_name]
-    if div_row.empty:
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
         return None
-    
-    starting_bal = div_row["starting_balance"].values[0]
-    
-    div_transactions = transactions[transactions["division"] == division_name] if not transactions.empty else pd.DataFrame()
-    
-    if div_transactions.empty:
-        credits = 0
-        debits = 0
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def _index_position():
+    # A compaction rewrites transactions.csv and replaces the journal under
+    # ledger_lock, so both are looked at under it to see one ledger state.
+    with ledger_lock():
+        journal_size, journal_inode = _journal_state()
+        return _file_signature(TRANSACTIONS_FILE), journal_size, journal_inode
+
+
+def _new_balance_entry(starting_balance=None):
+    return {
+        "starting_balance": starting_balance,
+        "credits": 0.0,
+        "debits": 0.0,
+        "debit_count": 0,
+        "transaction_count": 0
+    }
+
+
+def _rebuild_ledger_index(section, transactions=None):
+    # The caller holds ledger_lock, so no journal record can land between
+    # reading the ledger and noting the journal position it covers.
+    base_signature, journal_size, journal_inode = _index_position()
+    if transactions is None:
+        transactions = _projected_transactions(BALANCE_INDEX_COLUMNS)
+    else:
+        transactions = coerce_transaction_dtypes(
+            transactions.reindex(columns=BALANCE_INDEX_COLUMNS))
+    build = LEDGER_INDEX_SECTIONS[section][1]
+    index = {
+        "format": BALANCE_INDEX_FORMAT,
+        "base": base_signature,
+        "journal": [journal_inode, journal_size],
+        **build(transactions)
+    }
+    if section == "balances":
+        index = _with_starting_balances(index)
+    _ledger_indexes[section] = index
+    return index
+
+
+def _save_ledger_indexes(indexes):
+    # Checkpoints are written outside ledger_lock. Each one covers a fixed
+    # ledger position and is never modified once published, so a checkpoint
+    # that lands after newer journal records is still valid: readers replay
+    # the rest.
+    for section, index in indexes.items():
+        _write_json(index, LEDGER_INDEX_SECTIONS[section][0])
+
+
+def _balances_from(transactions):
+    entries = {}
+    if not transactions.empty:
+        grouped = transactions.groupby(
+            [transactions["division"].astype(str),
+             transactions["type"]],
+            observed=True)["amount"].agg(["sum", "count"])
+        for (div_name, trans_type), (total, count) in grouped.iterrows():
+            entry = entries.setdefault(div_name, _new_balance_entry())
+            entry["transaction_count"] += int(count)
+            if trans_type == "credit":
+                entry["credits"] += float(total)
+            elif trans_type == "debit":
+                entry["debits"] += float(total)
+                entry["debit_count"] += int(count)
+    return {"divisions": entries, "divisions_signature": None}
+
+
+def _with_starting_balances(index):
+    # Starting balances are taken from divisions.csv, in its order, rather
+    # than kept up to date by the division functions. Deleted divisions that
+    # still have transactions stay in the index with starting_balance None.
+    signature = _file_signature(DIVISIONS_FILE)
+    divisions = _cached_divisions()
+    old_entries = index["divisions"]
+    entries = {}
+    for div_name, starting_balance in zip(divisions["division"].astype(str),
+                                          divisions["starting_balance"]):
+        entry = dict(old_entries.get(div_name) or _new_balance_entry())
+        entry["starting_balance"] = float(starting_balance)
+        entries[div_name] = entry
+    for div_name, entry in old_entries.items():
+        if div_name not in entries and entry["transaction_count"]:
+            entries[div_name] = dict(entry, starting_balance=None)
+    return dict(index, divisions=entries, divisions_signature=signature)
+
+
+def _index_usable(index, base_signature, journal_size, journal_inode):
+    # An index covers transactions.csv as of "base" plus the journal up to
+    # its offset; later records can be replayed on top of it as long as the
+    # journal is still the same file. An index taken when there was no
+    # journal covers none of it, so it can replay the first journal that
+    # appears on the same base.
+    if not isinstance(index, dict) or \
+            index.get("format") != BALANCE_INDEX_FORMAT:
+        return False
+    inode, offset = index["journal"]
+    return (index["base"] == base_signature and offset <= journal_size
+            and (inode == journal_inode or (inode is None and offset == 0)))
+
+
+def _load_ledger_index(section, base_signature, journal_size, journal_inode):
+    # The files are checkpoints, written by migrate_storage() and whenever
+    # transactions.csv is rewritten; journal records appended since are
+    # replayed on top.
+    try:
+        with open(LEDGER_INDEX_SECTIONS[section][0], encoding="utf-8") as f:
+            stored = json.load(f)
+            perf_utils.record_bytes("read", os.fstat(f.fileno()).st_size)
+    except (OSError, ValueError):
+        return None
+    if not _index_usable(stored, base_signature, journal_size, journal_inode):
+        return None
+    return stored
+
+
+def _record_deltas(record):
+    # (row, sign) pairs a journal record applies to the index, or None for
+    # an update/delete written before records carried the old row.
+    op = record.get("op")
+    if op == "add":
+        return [(record["row"], 1)]
+    before = record.get("before")
+    if before is None:
+        return None
+    if op == "update":
+        return [(before, -1), (dict(before, **record["fields"]), 1)]
+    if op == "delete":
+        return [(before, -1)]
+    return []
+
+
+def _writable(container, key, copied, default):
+    # Copy-on-write step for journal replay: the first time a replay
+    # touches a nested dict or cell it is replaced by a copy (remembered in
+    # copied), so a published index is never modified while others read it.
+    value = container.get(key)
+    if value is None:
+        value = default()
+    elif id(value) in copied:
+        return value
     else:
-        credits = div_transactions[div_transactions["type"] == "credit"]["amount"].sum()
-        debits = div_transactions[div_transactions["type"] == "debit"]["amount"].sum()
-    
-    return starting_bal + credits - debits
+        value = value.copy()
+    container[key] = value
+    copied[id(value)] = value
+    return value
+
+
+def _replay_index_journal(section, index, journal_size, journal_inode):
+    # Returns a new index with the records appended since index was taken;
+    # index itself is left as it is.
+    inode, offset = index["journal"]
+    if offset >= journal_size:
+        return index
+    records, end = _read_journal(offset, inode=journal_inode)
+    if end == offset:
+        return index
+    apply_delta = LEDGER_INDEX_SECTIONS[section][2]
+    index = dict(index, journal=[journal_inode, end])
+    copied = {id(index): index}
+    for record in records:
+        deltas = _record_deltas(record)
+        if deltas is None:
+            return None
+        for row, sign in deltas:
+            apply_delta(index, row, sign, copied)
+    return index
+
+
+def _get_ledger_index(section="balances"):
+    # Writers only append to the journal; each section catches up here by
+    # replaying the records appended since it was last read, so a section
+    # nobody reads costs nothing. Catching up publishes a new index object
+    # rather than changing the current one, so callers can read what they
+    # get back without holding any lock.
+    with _index_lock:
+        while True:
+            position = _index_position()
+            index = _ledger_indexes.get(section)
+            if not _index_usable(index, *position):
+                index = None
+                break
+            index = _replay_index_journal(section, index, *position[1:])
+            # The replay reads the journal after ledger_lock is released; a
+            # compaction in between can leave a new journal on a reused
+            # inode, so start over if the base has changed since.
+            if _file_signature(TRANSACTIONS_FILE) == position[0]:
+                break
+        if index is None:
+            with ledger_lock():
+                position = _index_position()
+                index = _load_ledger_index(section, *position)
+                if index is not None:
+                    index = _replay_index_journal(section, index,
+                                                  *position[1:])
+                if index is None:
+                    index = _rebuild_ledger_index(section)
+        if section == "balances" and index["divisions_signature"] != \
+                _file_signature(DIVISIONS_FILE):
+            index = _with_starting_balances(index)
+        _ledger_indexes[section] = index
+    return index
+
+
+def _get_balance_index():
+    return _get_ledger_index()["divisions"]
+
+
+def _row_stamp(value):
+    try:
+        return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+
+def _index_row(row):
+    # The fields the index is kept from, JSON-safe, stored as the "before"
+    # of update and delete journal records so that replaying them needs no
+    # ledger lookup.
+    return {
+        "datetime": _row_stamp(row["datetime"]),
+        "name": str(row["name"]),
+        "division": str(row["division"]),
+        "type": str(row["type"]),
+        "amount": float(row["amount"]),
+        "latitude": _to_coordinate(row.get("latitude")),
+        "longitude": _to_coordinate(row.get("longitude"))
+    }
+
+
+def _row_date(value):
+    try:
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_coordinate(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def _has_location(row):
+    return (_to_coordinate(row.get("latitude")) is not None
+            and _to_coordinate(row.get("longitude")) is not None)
+
+
+def _daily_rollup_from(transactions):
+    # {date: {division: {type: [amount, count]}}} with ISO date keys.
+    daily = {}
+    if transactions.empty:
+        return daily
+    grouped = transactions.groupby(
+        [transactions["datetime"].dt.strftime("%Y-%m-%d"),
+         transactions["division"].astype(str),
+         transactions["type"].astype(str)])["amount"].agg(["sum", "count"])
+    for (date, div_name, trans_type), (total, count) in grouped.iterrows():
+        daily.setdefault(date, {}).setdefault(div_name, {})[trans_type] = [
+            float(total), int(count)
+        ]
+    return daily
+
+
+def _located_counts_from(transactions):
+    if transactions.empty:
+        return {}
+    located = transactions[transactions["latitude"].notna()
+                           & transactions["longitude"].notna()]
+    counts = located.groupby(
+        located["datetime"].dt.strftime("%Y-%m-%d")).size()
+    return {date: int(count) for date, count in counts.items()}
+
+
+def _new_cell():
+    return [0.0, 0]
+
+
+def _apply_daily_delta(index, row, sign, copied):
+    date = _row_date(row["datetime"])
+    if date is None:
+        return
+    daily = _writable(index, "daily", copied, dict)
+    divisions = _writable(daily, date, copied, dict)
+    types = _writable(divisions, str(row["division"]), copied, dict)
+    cell = _writable(types, str(row["type"]), copied, _new_cell)
+    cell[0] += sign * float(row["amount"])
+    cell[1] += sign
+    # Drop emptied cells so the rollup stays proportional to live days.
+    if cell[1] <= 0:
+        del types[str(row["type"])]
+        if not types:
+            del divisions[str(row["division"])]
+            if not divisions:
+                del daily[date]
+    if _has_location(row):
+        located = _writable(index, "located", copied, dict)
+        located[date] = located.get(date, 0) + sign
+        if located[date] <= 0:
+            del located[date]
+
+
+def _spenders_from(transactions):
+    # Debit totals per student: "spenders" is {division: {name: [amount,
+    # count]}} and "spenders_total" the same across all divisions.
+    spenders = {}
+    spenders_total = {}
+    debits = transactions[transactions["type"] == "debit"]
+    if not debits.empty:
+        names = debits["name"].astype(str)
+        grouped = debits.groupby([debits["division"].astype(str), names
+                                  ])["amount"].agg(["sum", "count"])
+        for (div_name, name), (total, count) in grouped.iterrows():
+            spenders.setdefault(div_name, {})[name] = [float(total),
+                                                       int(count)]
+        grouped = debits.groupby(names)["amount"].agg(["sum", "count"])
+        for name, (total, count) in grouped.iterrows():
+            spenders_total[name] = [float(total), int(count)]
+    return {"spenders": spenders, "spenders_total": spenders_total}
+
+
+def _apply_spender_delta(totals, name, amount, sign, copied):
+    cell = _writable(totals, name, copied, _new_cell)
+    cell[0] += sign * amount
+    cell[1] += sign
+    if cell[1] <= 0:
+        del totals[name]
+
+
+def _rollups_from(transactions):
+    return {
+        "daily": _daily_rollup_from(transactions),
+        "located": _located_counts_from(transactions),
+        **_spenders_from(transactions)
+    }
+
+
+def _apply_rollups_delta(index, row, sign, copied):
+    _apply_daily_delta(index, row, sign, copied)
+    _apply_spenders_delta(index, row, sign, copied)
+
+
+def _apply_balances_delta(index, row, sign, copied):
+    entries = _writable(index, "divisions", copied, dict)
+    entry = _writable(entries, str(row["division"]), copied,
+                      _new_balance_entry)
+    amount = float(row["amount"])
+    entry["transaction_count"] += sign
+    if row["type"] == "credit":
+        entry["credits"] += sign * amount
+    elif row["type"] == "debit":
+        entry["debits"] += sign * amount
+        entry["debit_count"] += sign
+
+
+def _apply_spenders_delta(index, row, sign, copied):
+    if row["type"] == "debit":
+        name = str(row["name"])
+        amount = float(row["amount"])
+        division = str(row["division"])
+        spenders = _writable(index, "spenders", copied, dict)
+        by_division = _writable(spenders, division, copied, dict)
+        _apply_spender_delta(by_division, name, amount, sign, copied)
+        if not by_division:
+            del spenders[division]
+        _apply_spender_delta(_writable(index, "spenders_total", copied, dict),
+                             name, amount, sign, copied)
+
+
+# Sections of the ledger index: name -> (checkpoint file, builder from a
+# transactions frame, per-row delta). Each is loaded, replayed and rebuilt on
+# its own, so balance checks never load or replay the rollups.
+LEDGER_INDEX_SECTIONS = {
+    "balances": (BALANCE_INDEX_FILE, _balances_from, _apply_balances_delta),
+    "rollups": (LEDGER_ROLLUPS_FILE, _rollups_from, _apply_rollups_delta)
+}
 
 
-def add_transaction(name, student_class, division, trans_type, amount, description, receipt_path="", validate_balance=False, latitude="", longitude=""):
-    if not division_exists(division):
+def _registered_balance_entries(entries=None):
+    if entries is None:
+        entries = _get_balance_index()
+    return [(div_name, entry)
+            for div_name, entry in entries.items()
+            if entry["starting_balance"] is not None]
+
+
+@_storage_api
+def get_division_balance(division_name):
+    entry = _get_balance_index().get(str(division_name))
+    if entry is None or entry["starting_balance"] is None:
         return None
-    
-    if validate_balance and trans_type == "debit":
-        current_balance = get_division_balance(division)
-        if current_balance is not None and float(amount) > current_balance:
-            return "INSUFFICIENT_FUNDS"
-    
-    df = load_transactions()
+    return entry["starting_balance"] + entry["credits"] - entry["debits"]
+
+
+@perf_utils.instrumented
+def add_transaction(name, student_class, division, trans_type, amount, description, receipt_path="", validate_balance=False, latitude="", longitude="", receipt_upload=None):
+    # With receipt_upload the file is streamed to a partial file first and
+    # only moved into receipts/ once the row has been committed. It is
+    # staged after the row is built, so a bad amount leaves nothing behind.
     new_row = {
         "id": generate_transaction_id(),
         "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -122,110 +1399,459 @@ def add_transaction(name, student_class, division, trans_type, amount, descripti
         "latitude": latitude,
         "longitude": longitude
     }
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    save_transactions(df)
+    staged = None
+    if receipt_upload is not None:
+        staged = stage_receipt(receipt_upload)
+        new_row["receipt_path"] = staged["path"]
+    result = None
+    try:
+        result = reserve_and_commit(new_row, validate_balance=validate_balance)
+    finally:
+        if staged is not None:
+            if result in (None, "INSUFFICIENT_FUNDS"):
+                discard_receipt(staged)
+            else:
+                publish_receipt(staged)
+    return result
+
+
+@_storage_api
+def reserve_and_commit(new_row, validate_balance=False):
+    division = new_row["division"]
+    with division_lock(division):
+        # Every writer that can move this division's balance holds its lock,
+        # so the balance checked here is still current when the row lands.
+        entry = _get_balance_index().get(str(division))
+        if entry is None or entry["starting_balance"] is None:
+            return None
+        if validate_balance and new_row["type"] == "debit":
+            balance = (entry["starting_balance"] + entry["credits"] -
+                       entry["debits"])
+            if float(new_row["amount"]) > balance:
+                return "INSUFFICIENT_FUNDS"
+        _append_journal({
+            "op": "add",
+            "id": new_row["id"],
+            "row": new_row
+        })
     return new_row["id"]
 
 
+def _find_transaction_row(trans_id):
+    with _cache_lock:
+        return _lookup_transaction(_current_ledger_cache(), trans_id)
+
+
+@_storage_api
+def get_transaction(trans_id):
+    row = _find_transaction_row(trans_id)
+    if row is None:
+        return None
+    typed = coerce_transaction_dtypes(
+        pd.DataFrame([row], columns=TRANSACTIONS_COLUMNS))
+    return typed.iloc[0].to_dict()
+
+
+def _filter_mask(df, trans_type=None, division=None, name=None):
+    mask = pd.Series(True, index=df.index)
+    for col, value in (("type", trans_type), ("division", division),
+                       ("name", name)):
+        if value is not None:
+            mask &= df[col] == value
+    return mask
+
+
+@_storage_api
+def count_transactions(trans_type=None, division=None, name=None):
+    if name is None and trans_type in (None, "credit", "debit"):
+        # Type/division counts come straight from the balance index.
+        index = _get_balance_index()
+        entries = (index.values() if division is None else
+                   [index[str(division)]] if str(division) in index else [])
+        total = 0
+        for entry in entries:
+            if trans_type is None:
+                total += entry["transaction_count"]
+            elif trans_type == "debit":
+                total += entry["debit_count"]
+            else:
+                total += entry["transaction_count"] - entry["debit_count"]
+        return total
+    df = _projected_transactions(["type", "division", "name"])
+    return int(_filter_mask(df, trans_type, division, name).sum())
+
+
+def _sorted_page_keys(frame, sort_by, trans_type, division, name):
+    # The filtered rows' (key, id), ascending, on frame's index.
+    mask = _filter_mask(frame, trans_type, division, name)
+    key = frame.loc[mask, sort_by]
+    if isinstance(key.dtype, pd.CategoricalDtype):
+        key = key.astype(str)
+    elif sort_by == "datetime":
+        key = key.fillna(pd.Timestamp.min)
+    return pd.DataFrame({
+        "key": key,
+        "id": frame.loc[mask, "id"]
+    }).sort_values(["key", "id"], kind="stable")
+
+
+def _merge_page_keys(ordered, appended):
+    # Inserts the sorted appended rows into ordered by binary search, after
+    # any equal (key, id), as a stable sort of the whole would.
+    keys = ordered["key"]
+    ids = ordered["id"]
+    low = keys.searchsorted(appended["key"], side="left")
+    high = keys.searchsorted(appended["key"], side="right")
+    positions = low.copy()
+    for i in np.nonzero(high > low)[0]:
+        positions[i] += ids.iloc[low[i]:high[i]].searchsorted(
+            appended["id"].iloc[i], side="right")
+    take = np.insert(np.arange(len(ordered)), positions,
+                     np.arange(len(ordered), len(ordered) + len(appended)))
+    return pd.concat([ordered, appended]).iloc[take]
+
+
+def _page_order(cache, sort_by, trans_type, division, name):
+    # The filtered rows' (key, id) in ascending order, kept for the next
+    # pages (the last TRANSACTION_PAGE_ORDERS combinations). A frame that
+    # was rebuilt only because rows were appended gets those rows merged
+    # into the kept orders; updates and deletes start them over.
+    frame = _materialized(cache)
+    orders = cache["page_orders"]
+    if orders is not None and orders["frame"] is not frame:
+        if orders["rewrites"] == cache["rewrites"] and \
+                len(frame) >= orders["rows"]:
+            appended = frame.iloc[orders["rows"]:]
+            orders["orders"] = {
+                order_key: _merge_page_keys(
+                    ordered, _sorted_page_keys(appended, *order_key))
+                for order_key, ordered in orders["orders"].items()
+            }
+            orders.update(frame=frame, rows=len(frame))
+        else:
+            orders = None
+    if orders is None:
+        orders = cache["page_orders"] = {
+            "frame": frame,
+            "rows": len(frame),
+            "rewrites": cache["rewrites"],
+            "orders": {}
+        }
+    order_key = (sort_by, trans_type, division, name)
+    ordered = orders["orders"].get(order_key)
+    if ordered is None:
+        ordered = _sorted_page_keys(frame, *order_key)
+        if len(orders["orders"]) >= TRANSACTION_PAGE_ORDERS:
+            del orders["orders"][next(iter(orders["orders"]))]
+        orders["orders"][order_key] = ordered
+    return frame, ordered
+
+
+@_storage_api
+def get_transactions_page(page_size=20, cursor=None, sort_by="datetime", descending=True, trans_type=None, division=None, name=None):
+    # Keyset pagination over (sort_by, id): cursor is the next_cursor of the
+    # previous page (None for the first), and next_cursor is None on the
+    # last page. The cursor is found by binary search in the sorted order,
+    # and only the page's rows are copied out of the cache.
+    if sort_by not in TRANSACTION_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort transactions by {sort_by!r}")
+    with _cache_lock:
+        df, ordered = _page_order(_current_ledger_cache(), sort_by,
+                                  trans_type, division, name)
+        keys = ordered["key"]
+        ids = ordered["id"]
+        if cursor is None:
+            position = len(ordered) if descending else 0
+        else:
+            value, last_id = cursor
+            low = keys.searchsorted(value, side="left")
+            high = keys.searchsorted(value, side="right")
+            position = low + ids.iloc[low:high].searchsorted(
+                last_id, side="left" if descending else "right")
+        if descending:
+            start, end = max(0, position - page_size), position
+            rows = ordered.index[start:end][::-1]
+            last, has_more = start, start > 0
+        else:
+            start, end = position, min(len(ordered), position + page_size)
+            rows = ordered.index[start:end]
+            last, has_more = end - 1, end < len(ordered)
+        next_cursor = None
+        if has_more and len(rows):
+            next_cursor = (keys.iloc[last], ids.iloc[last])
+        page = df.loc[rows].reset_index(drop=True)
+    return page, next_cursor
+
+
+@_storage_api
 def update_transaction(trans_id, name, student_class, division, trans_type, amount, description, receipt_path=None, latitude=None, longitude=None):
-    df = load_transactions()
-    idx = df[df["id"] == trans_id].index
-    if len(idx) > 0:
-        df.loc[idx[0], "name"] = name
-        df.loc[idx[0], "class"] = student_class
-        df.loc[idx[0], "division"] = division
-        df.loc[idx[0], "type"] = trans_type
-        df.loc[idx[0], "amount"] = float(amount)
-        df.loc[idx[0], "description"] = description
-        if receipt_path is not None:
-            df.loc[idx[0], "receipt_path"] = receipt_path
-        if latitude is not None:
-            df.loc[idx[0], "latitude"] = latitude
-        if longitude is not None:
-            df.loc[idx[0], "longitude"] = longitude
-        save_transactions(df)
-        return True
-    return False
+    fields = {
+        "name": name,
+        "class": student_class,
+        "division": division,
+        "type": trans_type,
+        "amount": float(amount),
+        "description": description
+    }
+    if receipt_path is not None:
+        fields["receipt_path"] = receipt_path
+    if latitude is not None:
+        fields["latitude"] = latitude
+    if longitude is not None:
+        fields["longitude"] = longitude
+    while True:
+        old_row = _find_transaction_row(trans_id)
+        if old_row is None:
+            return False
+        with division_lock(old_row["division"], division):
+            current = _find_transaction_row(trans_id)
+            if current is None:
+                return False
+            if str(current["division"]) != str(old_row["division"]):
+                # Moved to another division meanwhile; retry with its lock.
+                continue
+            _append_journal({
+                "op": "update",
+                "id": trans_id,
+                "fields": fields,
+                "before": _index_row(current)
+            })
+            return True
 
 
+@_storage_api
 def delete_transaction(trans_id):
-    df = load_transactions()
-    initial_len = len(df)
-    df = df[df["id"] != trans_id]
-    if len(df) < initial_len:
-        save_transactions(df)
-        return True
-    return False
+    while True:
+        old_row = _find_transaction_row(trans_id)
+        if old_row is None:
+            return False
+        with division_lock(old_row["division"]):
+            current = _find_transaction_row(trans_id)
+            if current is None:
+                return False
+            if str(current["division"]) != str(old_row["division"]):
+                continue
+            _append_journal({
+                "op": "delete",
+                "id": trans_id,
+                "before": _index_row(current)
+            })
+            return True
 
 
+@_storage_api
 def add_division(division_name, starting_balance):
-    df = load_divisions()
-    if division_name in df["division"].values:
-        return False
-    new_row = {
-        "division": division_name,
-        "starting_balance": float(starting_balance)
-    }
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    save_divisions(df)
+    with division_lock(division_name), ledger_lock():
+        df = _cached_divisions()
+        if division_name in df["division"].values:
+            return False
+        new_row = {
+            "division": division_name,
+            "starting_balance": float(starting_balance)
+        }
+        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+        _replace_divisions(df)
     return True
 
 
+@_storage_api
 def update_division(division_name, new_starting_balance):
-    df = load_divisions()
-    idx = df[df["division"] == division_name].index
-    if len(idx) > 0:
+    with division_lock(division_name), ledger_lock():
+        df = _cached_divisions().copy()
+        idx = df[df["division"] == division_name].index
+        if len(idx) == 0:
+            return False
         df.loc[idx[0], "starting_balance"] = float(new_starting_balance)
-        save_divisions(df)
-        return True
-    return False
+        _replace_divisions(df)
+    return True
 
 
+@_storage_api
 def delete_division(division_name):
-    df = load_divisions()
-    initial_len = len(df)
-    df = df[df["division"] != division_name]
-    if len(df) < initial_len:
-        save_divisions(df)
-        return True
-    return False
+    with division_lock(division_name), ledger_lock():
+        df = _cached_divisions()
+        initial_len = len(df)
+        df = df[df["division"] != division_name]
+        if len(df) == initial_len:
+            return False
+        _replace_divisions(df)
+    return True
 
 
+@_storage_api
 def get_division_list():
-    df = load_divisions()
+    df = _cached_divisions()
     return df["division"].tolist()
 
 
 def save_receipt(uploaded_file):
+    return publish_receipt(stage_receipt(uploaded_file))
+
+
+def stage_receipt(uploaded_file):
+    # Streams the upload in RECEIPT_CHUNK_BYTES pieces to a partial file,
+    # hashing as it goes, and returns {"path", "partial"}. "path" is where
+    # publish_receipt() will put it: receipts are stored under the SHA-256
+    # of their content, so uploading the same file twice keeps one copy.
     ensure_receipts_folder()
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{uploaded_file.name}"
-    filepath = os.path.join(RECEIPTS_FOLDER, filename)
-    with open(filepath, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    return filepath
+    Path(RECEIPT_PARTIAL_FOLDER).mkdir(exist_ok=True)
+    collect_partial_receipts()
+    digest = hashlib.sha256()
+    size = 0
+    fd, partial_path = tempfile.mkstemp(suffix=".part",
+                                        dir=RECEIPT_PARTIAL_FOLDER)
+    try:
+        # Published receipts are new files: default mode, not mkstemp's.
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, "wb") as f:
+            uploaded_file.seek(0)
+            while True:
+                chunk = uploaded_file.read(RECEIPT_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > RECEIPT_MAX_BYTES:
+                    raise ValueError(
+                        f"Receipt is larger than the "
+                        f"{RECEIPT_MAX_BYTES // (1024 * 1024)} MB limit")
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(partial_path)
+        raise
+    extension = Path(uploaded_file.name).suffix.lower()
+    return {
+        "path": os.path.join(RECEIPTS_FOLDER,
+                             digest.hexdigest() + extension),
+        "partial": partial_path
+    }
+
+
+def publish_receipt(staged):
+    if os.path.exists(staged["path"]):
+        discard_receipt(staged)
+    else:
+        os.replace(staged["partial"], staged["path"])
+        _fsync_directory(RECEIPTS_FOLDER)
+    _schedule_thumbnails(staged["path"])
+    return staged["path"]
+
+
+def discard_receipt(staged):
+    try:
+        os.remove(staged["partial"])
+    except FileNotFoundError:
+        pass
+
+
+def collect_partial_receipts(max_age=RECEIPT_PARTIAL_MAX_AGE):
+    # Removes partial uploads left behind by requests that never finished.
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(RECEIPT_PARTIAL_FOLDER))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def is_image_receipt(receipt_path):
+    return str(receipt_path).lower().endswith(RECEIPT_IMAGE_EXTENSIONS)
+
+
+def _thumbnail_format():
+    if pil_features.check("webp"):
+        return "WEBP", ".webp"
+    return "JPEG", ".jpg"
+
+
+def _thumbnail_path(receipt_path, size):
+    return os.path.join(RECEIPT_THUMBNAILS_FOLDER,
+                        f"{Path(receipt_path).stem}-{size}"
+                        f"{_thumbnail_format()[1]}")
+
+
+def _generate_thumbnails(receipt_path):
+    image_format = _thumbnail_format()[0]
+    try:
+        Path(RECEIPT_THUMBNAILS_FOLDER).mkdir(parents=True, exist_ok=True)
+        with Image.open(receipt_path) as image:
+            # Phone photos carry their rotation in EXIF.
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            for size in sorted(RECEIPT_THUMBNAIL_SIZES, reverse=True):
+                image.thumbnail((size, size))
+                _atomic_write(_thumbnail_path(receipt_path, size),
+                              lambda f: image.save(f, format=image_format,
+                                                   quality=80),
+                              binary=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Unreadable image: the page falls back to the full-size file.
+        with _thumbnail_lock:
+            _thumbnail_failures.add(receipt_path)
+    finally:
+        with _thumbnail_lock:
+            _thumbnail_jobs.pop(receipt_path, None)
+
 
+def _schedule_thumbnails(receipt_path):
+    global _thumbnail_executor
+    if Image is None or not is_image_receipt(receipt_path):
+        return
+    with _thumbnail_lock:
+        if receipt_path in _thumbnail_jobs or \
+                receipt_path in _thumbnail_failures:
+            return
+        if _thumbnail_executor is None:
+            _thumbnail_executor = ThreadPoolExecutor(
+                max_workers=RECEIPT_THUMBNAIL_WORKERS,
+                thread_name_prefix="receipt-thumbnails")
+        _thumbnail_jobs[receipt_path] = _thumbnail_executor.submit(
+            _generate_thumbnails, receipt_path)
 
+
+def receipt_thumbnail(receipt_path, size=RECEIPT_THUMBNAIL_SIZES[-1]):
+    # Path to show for an image receipt: its thumbnail, the receipt itself
+    # if no thumbnail can be made, or None while one is being generated.
+    # Missing thumbnails (e.g. for receipts saved before thumbnails existed)
+    # are queued here and show up on a later render.
+    with _thumbnail_lock:
+        failed = receipt_path in _thumbnail_failures
+    if Image is None or failed:
+        return receipt_path
+    thumbnail_path = _thumbnail_path(receipt_path, size)
+    if os.path.exists(thumbnail_path):
+        return thumbnail_path
+    _schedule_thumbnails(receipt_path)
+    return None
+
+
+@_storage_api
 def calculate_financials():
-    transactions = load_transactions()
-    divisions = load_divisions()
-    
-    total_starting_balance = divisions["starting_balance"].sum() if not divisions.empty else 0
-    
-    if transactions.empty:
-        return {
-            "total_credited": total_starting_balance,
-            "total_spent": 0,
-            "remaining_balance": total_starting_balance,
-            "credits_added": 0
-        }
-    
-    credits = transactions[transactions["type"] == "credit"]["amount"].sum()
-    debits = transactions[transactions["type"] == "debit"]["amount"].sum()
-    
+    return _financials_from(_get_balance_index())
+
+
+def _financials_from(entries):
+    total_starting_balance = 0.0
+    credits = 0.0
+    debits = 0.0
+    for entry in entries.values():
+        if entry["starting_balance"] is not None:
+            total_starting_balance += entry["starting_balance"]
+        credits += entry["credits"]
+        debits += entry["debits"]
+
     total_credited = total_starting_balance + credits
     remaining_balance = total_credited - debits
-    
+
     return {
         "total_credited": total_credited,
         "total_spent": debits,
@@ -234,27 +1860,21 @@ def calculate_financials():
     }
 
 
+@_storage_api
 def calculate_division_summary():
-    transactions = load_transactions()
-    divisions = load_divisions()
-    
+    return _division_summary_from(_get_balance_index())
+
+
+def _division_summary_from(entries):
     summary = []
-    for _, div_row in divisions.iterrows():
-        div_name = div_row["division"]
-        starting_bal = div_row["starting_balance"]
-        
-        div_transactions = transactions[transactions["division"] == div_name] if not transactions.empty else pd.DataFrame()
-        
-        if div_transactions.empty:
-            credits = 0
-            debits = 0
-        else:
-            credits = div_transactions[div_transactions["type"] == "credit"]["amount"].sum()
-            debits = div_transactions[div_transactions["type"] == "debit"]["amount"].sum()
-        
+    for div_name, entry in _registered_balance_entries(entries):
+        starting_bal = entry["starting_balance"]
+        credits = entry["credits"]
+        debits = entry["debits"]
+
         total_funds = starting_bal + credits
         remaining = total_funds - debits
-        
+
         summary.append({
             "Division": div_name,
             "Starting Balance": starting_bal,
@@ -262,47 +1882,107 @@ def calculate_division_summary():
             "Total Spent": debits,
             "Remaining Balance": remaining
         })
-    
+
     return pd.DataFrame(summary)
 
 
+@_storage_api
 def get_division_transactions(division_name):
-    transactions = load_transactions()
+    transactions = _cached_transactions()
     if transactions.empty:
         return pd.DataFrame(columns=TRANSACTIONS_COLUMNS)
     return transactions[transactions["division"] == division_name]
 
 
+@_storage_api
 def get_division_stats(division_name):
-    divisions = load_divisions()
-    transactions = load_transactions()
-    
-    div_row = divisions[divisions["division"] == division_name]
-    if div_row.empty:
+    entry = _get_balance_index().get(str(division_name))
+    if entry is None or entry["starting_balance"] is None:
         return None
-    
-    starting_bal = div_row["starting_balance"].values[0]
-    div_transactions = transactions[transactions["division"] == division_name] if not transactions.empty else pd.DataFrame()
-    
-    if div_transactions.empty:
-        return {
-            "starting_balance": starting_bal,
-            "credits_added": 0,
-            "total_spent": 0,
-            "remaining_balance": starting_bal,
-            "transaction_count": 0,
-            "avg_expense": 0
-        }
-    
-    credits = div_transactions[div_transactions["type"] == "credit"]["amount"].sum()
-    debits = div_transactions[div_transactions["type"] == "debit"]["amount"].sum()
-    debit_count = len(div_transactions[div_transactions["type"] == "debit"])
-    
+
+    starting_bal = entry["starting_balance"]
+    credits = entry["credits"]
+    debits = entry["debits"]
+    debit_count = entry["debit_count"]
+
     return {
         "starting_balance": starting_bal,
         "credits_added": credits,
         "total_spent": debits,
         "remaining_balance": starting_bal + credits - debits,
-        "transaction_count": len(div_transactions),
+        "transaction_count": entry["transaction_count"],
         "avg_expense": debits / debit_count if debit_count > 0 else 0
     }
+
+
+@_storage_api
+def get_daily_totals(division=None):
+    # Per-day credit/debit sums and counts from the daily rollup, so the
+    # timeline charts cost O(days) rather than O(transactions).
+    rows = []
+    for date, divisions in sorted(_get_ledger_index("rollups")["daily"].items()):
+        totals = {}
+        for div_name, types in divisions.items():
+            if division is not None and div_name != str(division):
+                continue
+            for trans_type, (amount, count) in types.items():
+                total = totals.setdefault(trans_type, [0.0, 0])
+                total[0] += amount
+                total[1] += count
+        for trans_type, (amount, count) in sorted(totals.items()):
+            rows.append({
+                "date": date,
+                "type": trans_type,
+                "amount": amount,
+                "count": count
+            })
+    df = pd.DataFrame(rows, columns=["date", "type", "amount", "count"])
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    return df
+
+
+@_storage_api
+def get_daily_location_counts():
+    located = sorted(_get_ledger_index("rollups")["located"].items())
+    df = pd.DataFrame(located, columns=["date", "count"])
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    return df
+
+
+@_storage_api
+def get_top_spenders(k=10, division=None):
+    # The k students with the largest debit totals, overall or within one
+    # division, picked from the maintained per-student totals.
+    index = _get_ledger_index("rollups")
+    if division is None:
+        totals = index["spenders_total"]
+    else:
+        totals = index["spenders"].get(str(division), {})
+    top = heapq.nlargest(k, totals.items(), key=lambda item: item[1][0])
+    return pd.DataFrame([(name, amount) for name, (amount, _) in top],
+                        columns=["name", "amount"])
+
+
+@_storage_api
+def get_dashboard_data(recent_count=5):
+    # Everything render_dashboard shows, from one read of the ledger index
+    # plus the newest recent_count rows.
+    entries = _get_ledger_index()["divisions"]
+    spending = [(div_name, entry["debits"])
+                for div_name, entry in entries.items()
+                if entry["debit_count"] > 0]
+    recent = _recent_transactions(recent_count)
+    return {
+        "financials": _financials_from(entries),
+        "division_summary": _division_summary_from(entries),
+        "spending_by_division": pd.DataFrame(spending,
+                                             columns=["division", "amount"]),
+        "transaction_count": sum(entry["transaction_count"]
+                                 for entry in entries.values()),
+        "recent": recent
+    }
+
+
+@_storage_api
+def get_recent_transactions(n=5, division=None):
+    return _recent_transactions(n, division)
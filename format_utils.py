@@ -0,0 +1,37 @@
+import pandas as pd
+
+# Display formatting for the Streamlit pages. The *_column functions format a
+# whole Series and produce the same text as the scalar formatters.
+
+CURRENCY_PREFIX = "AED "
+
+
+def format_currency(amount):
+    return f"{CURRENCY_PREFIX}{amount:,.2f}"
+
+
+def format_decimal_column(values, decimals=2, thousands=False):
+    # f"{value:.{decimals}f}" for every element, with "," digit grouping when
+    # thousands is set. Returns a str Series on the same index.
+    values = pd.Series(values, copy=False)
+    spec = f"{',' if thousands else ''}.{decimals}f"
+    return pd.Series([
+        f"{value:{spec}}"
+        for value in pd.to_numeric(values).to_numpy(dtype="float64")
+    ],
+                     index=values.index,
+                     dtype="str")
+
+
+def format_currency_column(amounts):
+    # format_currency() over a whole Series.
+    return CURRENCY_PREFIX + format_decimal_column(amounts, 2, thousands=True)
+
+
+def format_currency_columns(df, columns):
+    # Copy of df with each of columns that is present formatted as currency.
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            df[col] = format_currency_column(df[col])
+    return df
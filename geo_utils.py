@@ -0,0 +1,389 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from format_utils import format_currency_column
+
+# Spatial helpers for the Location Data page. Points are DataFrames with
+# "lat" and "lon" columns in degrees (WGS84).
+
+# Grid cells per 256px map tile edge when aggregating for a zoom level, so a
+# cell is roughly 64px wide on screen at that zoom.
+GRID_CELLS_PER_TILE = 4
+MIN_MAP_ZOOM = 2
+MAX_MAP_ZOOM = 18
+# Upper bound on the features a clustered map emits; coarser zoom levels are
+# used until the cell count fits.
+MAX_MAP_FEATURES = 2000
+
+
+def grid_cell_degrees(zoom):
+    return 360.0 / (2**zoom) / GRID_CELLS_PER_TILE
+
+
+def fit_zoom(points):
+    # Largest zoom at which the points' bounding box still fits one tile.
+    if points.empty:
+        return MIN_MAP_ZOOM
+    span = max(points["lat"].max() - points["lat"].min(),
+               points["lon"].max() - points["lon"].min())
+    if span <= 0:
+        return MAX_MAP_ZOOM
+    zoom = int(math.floor(math.log2(360.0 / span)))
+    return max(MIN_MAP_ZOOM, min(MAX_MAP_ZOOM, zoom))
+
+
+def grid_clusters(points, zoom):
+    # Buckets points into square grid cells sized for zoom and returns one
+    # row per non-empty cell: centroid lat/lon, point count and amount sum.
+    size = grid_cell_degrees(zoom)
+    cells = pd.DataFrame({
+        "row": np.floor(points["lat"].to_numpy(dtype="float64") / size),
+        "col": np.floor(points["lon"].to_numpy(dtype="float64") / size),
+        "lat": points["lat"].to_numpy(dtype="float64"),
+        "lon": points["lon"].to_numpy(dtype="float64"),
+        "amount": points["amount"].to_numpy(dtype="float64")
+    })
+    clusters = cells.groupby(["row", "col"], sort=False).agg(
+        lat=("lat", "mean"),
+        lon=("lon", "mean"),
+        count=("lat", "size"),
+        amount=("amount", "sum"))
+    return clusters.reset_index(drop=True)
+
+
+def bounded_grid_clusters(points, zoom, max_features=MAX_MAP_FEATURES):
+    # grid_clusters() at zoom, or at the first coarser zoom that yields at
+    # most max_features cells. Returns (clusters, zoom actually used).
+    while True:
+        clusters = grid_clusters(points, zoom)
+        if len(clusters) <= max_features or zoom <= MIN_MAP_ZOOM:
+            return clusters, zoom
+        zoom -= 1
+
+
+def clusters_geojson(clusters):
+    # GeoJSON FeatureCollection with one Point per cluster.
+    amounts = format_currency_column(clusters["amount"])
+    radii = 6 + 4 * np.log2(clusters["count"].to_numpy(dtype="float64"))
+    features = [{
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [lon, lat]
+        },
+        "properties": {
+            "count": count,
+            "amount": amount,
+            "radius": radius
+        }
+    } for lat, lon, count, amount, radius in zip(
+        clusters["lat"].tolist(), clusters["lon"].tolist(),
+        clusters["count"].tolist(), amounts.tolist(), radii.tolist())]
+    return {"type": "FeatureCollection", "features": features}
+
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+# Point pairs compared per round of proximity_clusters, to bound memory on
+# dense data.
+PAIR_BATCH_SIZE = 2_000_000
+# Bucket pairs that need a point-by-point check are compared one point pair
+# at a time in the first round and this many times more in each later one,
+# so pairs that link early stop early.
+PAIR_STEP_GROWTH = 4
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2)**2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _connected_labels(count, left, right):
+    # Connected components of an edge list by min-label propagation with
+    # pointer jumping; returns the smallest member index of each component.
+    labels = np.arange(count)
+    while True:
+        smaller = np.minimum(labels[left], labels[right])
+        updated = labels.copy()
+        np.minimum.at(updated, left, smaller)
+        np.minimum.at(updated, right, smaller)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def _key_lookup(keys, periods):
+    # Returns find(offset): for each row of keys (unique int64 rows), the row
+    # equal to it plus offset, or -1; a column with a period wraps modulo
+    # it (None for no wrapping). Each column is replaced by its rank
+    # among that column's values and the ranks are packed into one int64;
+    # should the packed range outgrow int64, the columns packed so far are
+    # re-ranked among the combinations that occur, so keys never collide.
+    folds = []
+    code = np.zeros(len(keys), dtype=np.int64)
+    size = 1
+    for column in keys.T:
+        values = np.unique(column)
+        combos = None
+        if size * len(values) >= 2**62:
+            combos = pd.Index(np.unique(code))
+            code = combos.get_indexer(code)
+            size = len(combos)
+        rank = np.searchsorted(values, column)
+        folds.append((pd.Index(values), rank, combos))
+        code = code * len(values) + rank
+        size *= len(values)
+    packed = pd.Index(code)
+
+    def find(offset):
+        code = np.zeros(len(keys), dtype=np.int64)
+        missing = np.zeros(len(keys), dtype=bool)
+        for shift, period, (values, rank, combos) in zip(offset, periods,
+                                                         folds):
+            if combos is not None:
+                code = combos.get_indexer(code)
+                missing |= code < 0
+            # Shift the distinct values, then map each key through them.
+            targets = values + shift
+            if period is not None:
+                targets = targets % period
+            shifted = values.get_indexer(targets)[rank]
+            missing |= shifted < 0
+            code = code * len(values) + shifted
+        rows = packed.get_indexer(code)
+        rows[missing] = -1
+        return rows
+
+    return find
+
+
+def _box_distance_bounds(box_a, box_b):
+    # Smallest and largest haversine distance (metres) between any point of
+    # box_a and any point of box_b, each (lat_lo, lat_hi, lon_lo, lon_hi)
+    # arrays in radians. Both terms of the haversine are bounded separately,
+    # so the bounds are safe but not always tight.
+    lat_lo_a, lat_hi_a, lon_lo_a, lon_hi_a = box_a
+    lat_lo_b, lat_hi_b, lon_lo_b, lon_hi_b = box_b
+    # Measure longitudes the short way round, across the antimeridian.
+    turn = 2 * np.pi * np.round(
+        (lon_lo_b + lon_hi_b - lon_lo_a - lon_hi_a) / (4 * np.pi))
+    lon_lo_b = lon_lo_b - turn
+    lon_hi_b = lon_hi_b - turn
+    lat_gap = np.maximum(np.maximum(lat_lo_b - lat_hi_a, lat_lo_a - lat_hi_b),
+                         0.0)
+    lat_span = np.maximum(lat_hi_b - lat_lo_a, lat_hi_a - lat_lo_b)
+    lon_gap = np.maximum(np.maximum(lon_lo_b - lon_hi_a, lon_lo_a - lon_hi_b),
+                         0.0)
+    lon_span = np.maximum(lon_hi_b - lon_lo_a, lon_hi_a - lon_lo_b)
+
+    def cos_range(lo, hi):
+        nearest = np.where((lo <= 0) & (hi >= 0), 0.0,
+                           np.minimum(np.abs(lo), np.abs(hi)))
+        farthest = np.maximum(np.abs(lo), np.abs(hi))
+        return np.cos(farthest), np.cos(nearest)
+
+    cos_min_a, cos_max_a = cos_range(lat_lo_a, lat_hi_a)
+    cos_min_b, cos_max_b = cos_range(lat_lo_b, lat_hi_b)
+    # sin(x / 2)**2 only grows with x up to pi; past that the longitude
+    # term is bounded by 0 and 1.
+    low = (np.sin(lat_gap / 2)**2 + cos_min_a * cos_min_b *
+           np.where(lon_span <= np.pi, np.sin(lon_gap / 2)**2, 0.0))
+    high = (np.sin(np.minimum(lat_span, np.pi) / 2)**2 +
+            cos_max_a * cos_max_b * np.sin(np.minimum(lon_span, np.pi) / 2)**2)
+    return (2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(low, 1.0))),
+            2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(high, 1.0))))
+
+
+def proximity_clusters(points, radius_m=50.0, window=None, min_points=2):
+    """Label points that lie within radius_m of each other.
+
+    Two points are neighbours when their haversine distance is at most
+    radius_m and, if window (a Timedelta) is given, their "datetime" values
+    are at most window apart. Clusters are the connected groups of
+    neighbours, as in DBSCAN with min_samples=2. Groups smaller than
+    min_points are labelled -1; the rest are numbered from 0, largest first.
+
+    Points are bucketed on a grid of cells (and time slots) small enough
+    that everything in one bucket is mutually neighbouring, so only nearby
+    buckets are considered. Two buckets are linked outright when their
+    bounding boxes guarantee every pair is neighbouring, skipped when they
+    guarantee none is, and otherwise compared point pair by point pair only
+    until one neighbouring pair is found or the buckets have been joined
+    through others.
+    """
+    count = len(points)
+    if count == 0:
+        return np.empty(0, dtype=np.int64)
+    lat = points["lat"].to_numpy(dtype="float64")
+    lon = (points["lon"].to_numpy(dtype="float64") + 180) % 360 - 180
+
+    # Cells are at most radius/sqrt(2) across at the latitude where they are
+    # widest, so a cell's diagonal never exceeds the radius. Columns divide
+    # the full circle evenly, so they wrap at the antimeridian.
+    cell_m = radius_m / math.sqrt(2)
+    abs_lat = np.abs(lat)
+    widest = math.cos(math.radians(abs_lat.min()))
+    narrowest = math.cos(math.radians(abs_lat.max()))
+    lat_step = cell_m / METERS_PER_DEGREE
+    col_count = max(1, math.ceil(360 * METERS_PER_DEGREE * widest / cell_m))
+    lon_step = 360 / col_count
+    lat_reach = math.ceil(radius_m / cell_m)
+    # Points further apart in longitude than max_dlon are out of reach even
+    # at the highest latitude, going over the pole:
+    # distance >= 2R * cos(lat) * sin(dlon / 2).
+    chord = radius_m / (2 * EARTH_RADIUS_M * narrowest)
+    if chord < 1:
+        max_dlon = 2 * math.degrees(math.asin(chord))
+        lon_reach = min(math.floor(max_dlon / lon_step) + 1, col_count // 2)
+    else:
+        lon_reach = col_count // 2
+
+    rows = np.floor(lat / lat_step).astype(np.int64)
+    cols = np.floor((lon + 180) / lon_step).astype(np.int64) % col_count
+    if window is None:
+        slots = np.zeros(count, dtype=np.int64)
+        seconds = None
+        time_reach = 0
+    else:
+        seconds = (points["datetime"].to_numpy(dtype="datetime64[ns]").astype(
+            np.int64) / 1e9)
+        window_s = pd.Timedelta(window).total_seconds()
+        slots = np.floor(seconds / window_s).astype(np.int64)
+        time_reach = 1
+
+    # Group points by bucket: order sorts them so each bucket's points are
+    # contiguous, starting at starts[b] with sizes[b] members.
+    keys = np.stack([rows, cols, slots], axis=1)
+    buckets, bucket_of = np.unique(keys, axis=0, return_inverse=True)
+    bucket_of = bucket_of.ravel()
+    order = np.argsort(bucket_of, kind="stable")
+    sizes = np.bincount(bucket_of, minlength=len(buckets))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # Every pair of buckets close enough on the grid to hold neighbours.
+    find = _key_lookup(buckets, (None, col_count, None))
+    pair_a = []
+    pair_b = []
+    # Column offsets wrap modulo col_count; lon_reach is at most half the
+    # columns, so no bucket is paired with itself.
+    offsets = [(dr, dc, dt)
+               for dr in range(-lat_reach, lat_reach + 1)
+               for dc in range(-lon_reach, lon_reach + 1)
+               for dt in range(-time_reach, time_reach + 1)
+               if (dr, dc, dt) > (0, 0, 0)]
+    for offset in offsets:
+        found = find(offset)
+        hit = found >= 0
+        pair_a.append(np.nonzero(hit)[0])
+        pair_b.append(found[hit])
+    a = np.concatenate(pair_a)
+    b = np.concatenate(pair_b)
+
+    # Bound each pair's distances by the buckets' bounding boxes; the
+    # margins keep float noise in the bounds from deciding a pair that sits
+    # right at the radius.
+    def bucket_range(values):
+        values = values[order]
+        return (np.minimum.reduceat(values, starts),
+                np.maximum.reduceat(values, starts))
+
+    box = (*bucket_range(np.radians(lat)), *bucket_range(np.radians(lon)))
+    nearest, farthest = _box_distance_bounds(tuple(side[a] for side in box),
+                                             tuple(side[b] for side in box))
+    linked = farthest < radius_m * (1 - 1e-9)
+    possible = nearest <= radius_m * (1 + 1e-9)
+    if seconds is not None:
+        first, last = bucket_range(seconds)
+        linked &= (np.maximum(last[b] - first[a], last[a] - first[b]) <=
+                   window_s)
+        possible &= (np.maximum(first[b] - last[a], first[a] - last[b]) <=
+                     window_s)
+    labels = _connected_labels(len(buckets), a[linked], b[linked])
+
+    # Compare the remaining pairs a growing slice of point pairs at a time,
+    # dropping each bucket pair once its buckets share a component.
+    candidates = possible & ~linked
+    a = a[candidates]
+    b = b[candidates]
+    compared = np.zeros(len(a), dtype=np.int64)
+    step = 1
+    while True:
+        open_pairs = labels[a] != labels[b]
+        a = a[open_pairs]
+        b = b[open_pairs]
+        compared = compared[open_pairs]
+        if len(a) == 0:
+            break
+        n = np.minimum(sizes[a] * sizes[b] - compared, step)
+        batch = max(int(np.searchsorted(np.cumsum(n), PAIR_BATCH_SIZE,
+                                        side="right")), 1)
+        n = n[:batch]
+        pair = np.repeat(np.arange(batch), n)
+        within = (compared[pair] + np.arange(n.sum()) -
+                  np.repeat(np.cumsum(n) - n, n))
+        i = order[starts[a][pair] + within // sizes[b][pair]]
+        j = order[starts[b][pair] + within % sizes[b][pair]]
+        close = haversine_m(lat[i], lon[i], lat[j], lon[j]) <= radius_m
+        if seconds is not None:
+            close &= np.abs(seconds[i] - seconds[j]) <= window_s
+        if close.any():
+            joined = np.unique(pair[close])
+            merged = _connected_labels(len(buckets), labels[a[joined]],
+                                       labels[b[joined]])
+            labels = merged[labels]
+        compared[:batch] += n
+        unfinished = compared < sizes[a] * sizes[b]
+        a = a[unfinished]
+        b = b[unfinished]
+        compared = compared[unfinished]
+        step = min(step * PAIR_STEP_GROWTH, PAIR_BATCH_SIZE)
+    labels = labels[bucket_of]
+
+    # Renumber: large enough groups from 0, biggest first; the rest -1.
+    roots, inverse, group_sizes = np.unique(labels,
+                                            return_inverse=True,
+                                            return_counts=True)
+    ranked = np.argsort(-group_sizes, kind="stable")
+    numbering = np.full(len(roots), -1, dtype=np.int64)
+    keep = ranked[group_sizes[ranked] >= min_points]
+    numbering[keep] = np.arange(len(keep))
+    return numbering[inverse.ravel()]
+
+
+def summarize_clusters(points, labels):
+    # One row per cluster: size, distinct students, a few of their names,
+    # total amount, time span and centroid.
+    clustered = points.assign(cluster=labels)
+    clustered = clustered[clustered["cluster"] >= 0]
+    if clustered.empty:
+        return pd.DataFrame(columns=[
+            "cluster", "count", "students", "sample_names", "amount",
+            "first", "last", "lat", "lon"
+        ])
+    clustered = clustered.assign(name=clustered["name"].astype(str))
+    summary = clustered.groupby("cluster").agg(
+        count=("id", "size"),
+        students=("name", "nunique"),
+        amount=("amount", "sum"),
+        first=("datetime", "min"),
+        last=("datetime", "max"),
+        lat=("lat", "mean"),
+        lon=("lon", "mean"))
+    # First three distinct names per cluster, joined column-wise so the
+    # cost does not grow with the number of clusters.
+    names = clustered.drop_duplicates(["cluster", "name"])
+    names = names.assign(rank=names.groupby("cluster").cumcount())
+    names = names[names["rank"] < 3].pivot(index="cluster",
+                                           columns="rank",
+                                           values="name")
+    sample = names[0]
+    for rank in names.columns[1:]:
+        sample = sample + (", " + names[rank]).fillna("")
+    summary["sample_names"] = sample.where(summary["students"] <= 3,
+                                           sample + ", ...")
+    return summary.reset_index()
@@ -0,0 +1,318 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import folium
+from folium.plugins import FastMarkerCluster
+from streamlit_folium import st_folium
+
+import geo_utils
+from format_utils import (format_currency, format_currency_column,
+                          format_decimal_column)
+from ui_utils import currency_columns
+
+from data_utils import (load_transactions, get_transaction,
+                        get_daily_location_counts)
+
+# The admin-only Location Data page. It is a module of its own so that folium
+# and streamlit_folium are only imported once someone opens it.
+
+# Above this many geotagged transactions the Location Data map defaults to
+# server-side clusters.
+LOCATION_FAST_MARKER_LIMIT = 2000
+
+# Time windows offered by the Location Data cluster detection; None links
+# nearby submissions regardless of when they were made.
+CLUSTER_TIME_WINDOWS = {
+    "Any time": None,
+    "1 hour": pd.Timedelta(hours=1),
+    "1 day": pd.Timedelta(days=1),
+    "7 days": pd.Timedelta(days=7)
+}
+
+# Leaflet callback for FastMarkerCluster rows [lat, lon, popup, color,
+# tooltip].
+FAST_MARKER_CALLBACK = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        color: row[3], fillColor: row[3], fillOpacity: 0.7, radius: 8
+    });
+    marker.bindPopup(row[2], {maxWidth: 300});
+    marker.bindTooltip(row[4]);
+    return marker;
+}
+"""
+
+
+def render():
+    if not st.session_state.is_admin:
+        st.error("Access denied. Please login as admin.")
+        return
+
+    st.title("📍 Location Data & Fraud Detection (Admin Only)")
+    st.markdown(
+        "View geolocation data and map visualization for fraud prevention.")
+    st.markdown("---")
+
+    st.warning(
+        "⚠️ This data is confidential and should only be used for fraud prevention purposes."
+    )
+
+    transactions = load_transactions()
+
+    if transactions.empty:
+        st.info("No transactions recorded yet.")
+        return
+
+    has_location = transactions[transactions["latitude"].notna()
+                                & transactions["longitude"].notna()]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Transactions", len(transactions))
+    with col2:
+        st.metric("With Location Data", len(has_location))
+    with col3:
+        coverage = (len(has_location) / len(transactions) *
+                    100) if len(transactions) > 0 else 0
+        st.metric("Location Coverage", f"{coverage:.1f}%")
+
+    st.markdown("---")
+
+    if not has_location.empty:
+        st.subheader("🗺️ Expense Submission Locations - Street View Map")
+        st.markdown(
+            "Interactive street-level map showing exact locations where expenses were submitted. Zoom in to see streets, buildings, and landmarks for fraud detection."
+        )
+
+        map_df = has_location.copy()
+        map_df["lat"] = map_df["latitude"]
+        map_df["lon"] = map_df["longitude"]
+
+        if not map_df.empty:
+            center_lat = map_df["lat"].mean()
+            center_lon = map_df["lon"].mean()
+
+            map_modes = ["Fast markers", "Server-side clusters"]
+            map_mode = st.radio(
+                "Map rendering",
+                map_modes,
+                index=0 if len(map_df) <= LOCATION_FAST_MARKER_LIMIT else 1,
+                horizontal=True,
+                help=
+                "Server-side clusters pre-aggregate points on a grid sized "
+                "for the zoom level, so the map stays light with thousands "
+                "of points.")
+
+            zoom = 12
+            if map_mode == "Server-side clusters":
+                zoom = st.slider("Cluster zoom level",
+                                 min_value=geo_utils.MIN_MAP_ZOOM,
+                                 max_value=geo_utils.MAX_MAP_ZOOM,
+                                 value=geo_utils.fit_zoom(map_df))
+
+            m = folium.Map(location=[center_lat, center_lon],
+                           zoom_start=zoom,
+                           tiles='OpenStreetMap')
+
+            division_colors = {
+                div: color
+                for div, color in zip(map_df["division"].unique(), [
+                    'red', 'blue', 'green', 'purple', 'orange', 'darkred',
+                    'lightred', 'beige', 'darkblue', 'darkgreen'
+                ])
+            }
+
+            if map_mode == "Server-side clusters":
+                clusters, used_zoom = geo_utils.bounded_grid_clusters(
+                    map_df, zoom)
+                folium.GeoJson(
+                    geo_utils.clusters_geojson(clusters),
+                    marker=folium.CircleMarker(fill=True,
+                                               fill_opacity=0.6,
+                                               color="#e74c3c"),
+                    style_function=lambda feature: {
+                        "radius": feature["properties"]["radius"]
+                    },
+                    tooltip=folium.GeoJsonTooltip(
+                        fields=["count", "amount"],
+                        aliases=["Transactions", "Total Amount"])).add_to(m)
+                st.caption(
+                    f"{len(map_df)} locations in {len(clusters)} clusters "
+                    f"(grid for zoom {used_zoom})")
+            else:
+                amounts = format_currency_column(map_df["amount"])
+                lat_text = format_decimal_column(map_df["lat"], 6)
+                lon_text = format_decimal_column(map_df["lon"], 6)
+                popups = (
+                    '<div style="font-family: Arial, sans-serif; min-width: 200px;">'
+                    '<h4 style="margin: 0 0 10px 0; color: #333;">Transaction Details</h4>'
+                    '<table style="width: 100%; border-collapse: collapse;">'
+                    '<tr><td><b>ID:</b></td><td>' + map_df["id"] +
+                    '</td></tr><tr><td><b>Student:</b></td><td>' +
+                    map_df["name"].astype(str) +
+                    '</td></tr><tr><td><b>Class:</b></td><td>' +
+                    map_df["class"].astype(str) +
+                    '</td></tr><tr><td><b>Division:</b></td><td>' +
+                    map_df["division"].astype(str) +
+                    '</td></tr><tr><td><b>Amount:</b></td><td>' + amounts +
+                    '</td></tr><tr><td><b>Date:</b></td><td>' +
+                    map_df["datetime"].astype(str) +
+                    '</td></tr><tr><td><b>Coordinates:</b></td><td>' +
+                    lat_text + ', ' + lon_text + '</td></tr></table>'
+                    '<div style="margin-top: 10px;">'
+                    '<a href="https://www.google.com/maps?q=' + lat_text +
+                    ',' + lon_text + '" target="_blank" '
+                    'style="background: #4285f4; color: white; padding: 6px 12px; text-decoration: none; border-radius: 4px; display: inline-block;">'
+                    'View on Google Maps</a></div></div>')
+                colors = map_df["division"].astype(str).map(
+                    division_colors).fillna("gray")
+                tooltips = map_df["name"].astype(str) + " - " + amounts
+                # One JS callback builds every marker in the browser instead
+                # of a folium.Marker object per row.
+                FastMarkerCluster(
+                    data=list(
+                        zip(map_df["lat"], map_df["lon"], popups, colors,
+                            tooltips)),
+                    callback=FAST_MARKER_CALLBACK).add_to(m)
+
+            legend_html = """
+            <div style="position: fixed; bottom: 50px; left: 50px; z-index: 1000; background: white; 
+                        padding: 10px; border-radius: 5px; border: 2px solid gray; font-size: 12px;">
+                <b>Division Colors:</b><br>
+            """
+            for div, color in division_colors.items():
+                legend_html += f'<i class="fa fa-map-marker" style="color:{color}"></i> {div}<br>'
+            legend_html += "</div>"
+            if map_mode != "Server-side clusters":
+                m.get_root().html.add_child(folium.Element(legend_html))
+
+            st_folium(m, width=None, height=500, use_container_width=True)
+
+            st.markdown("---")
+            st.subheader("📊 Location Analysis")
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.markdown("**Submissions by Division (with location)**")
+                div_counts = map_df.groupby("division").size().reset_index(
+                    name="count")
+                fig_div = px.pie(div_counts,
+                                 values="count",
+                                 names="division",
+                                 title="Distribution by Division")
+                st.plotly_chart(fig_div, use_container_width=True)
+
+            with col2:
+                st.markdown("**Submission Timeline**")
+                daily_counts = get_daily_location_counts()
+                fig_timeline = px.bar(daily_counts,
+                                      x="date",
+                                      y="count",
+                                      title="Daily Submissions with Location")
+                fig_timeline.update_layout(xaxis_title="Date",
+                                           yaxis_title="Count")
+                st.plotly_chart(fig_timeline, use_container_width=True)
+
+            st.markdown("---")
+            st.subheader("🔍 Cluster Detection")
+            st.markdown(
+                "Transactions submitted within the radius of one another "
+                "(and within the time window) are grouped; large groups may "
+                "indicate coordinated submissions.")
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                cluster_radius = st.number_input("Radius (m)",
+                                                 min_value=1,
+                                                 max_value=5000,
+                                                 value=50,
+                                                 step=10)
+            with col2:
+                cluster_window = st.selectbox("Within",
+                                              list(CLUSTER_TIME_WINDOWS),
+                                              index=0)
+            with col3:
+                cluster_min = st.number_input("Minimum transactions",
+                                              min_value=2,
+                                              value=2,
+                                              step=1)
+
+            labels = geo_utils.proximity_clusters(
+                map_df,
+                radius_m=cluster_radius,
+                window=CLUSTER_TIME_WINDOWS[cluster_window],
+                min_points=cluster_min)
+            clusters = geo_utils.summarize_clusters(map_df, labels)
+
+            if clusters.empty:
+                st.info("No clusters found with these settings.")
+            else:
+                st.dataframe(clusters[[
+                    "count", "students", "sample_names", "amount", "first",
+                    "last", "lat", "lon"
+                ]].rename(
+                    columns={
+                        "count": "Transaction Count",
+                        "students": "Distinct Students",
+                        "sample_names": "Students",
+                        "amount": "Total Amount",
+                        "first": "First",
+                        "last": "Last",
+                        "lat": "Latitude",
+                        "lon": "Longitude"
+                    }),
+                             use_container_width=True,
+                             hide_index=True,
+                             column_config=currency_columns("Total Amount"))
+        else:
+            st.info("Location data could not be parsed for mapping.")
+
+    st.markdown("---")
+    st.subheader("📋 All Transactions with Location Data")
+
+    if has_location.empty:
+        st.info("No transactions have location data yet.")
+    else:
+        display_df = has_location[[
+            "id", "datetime", "name", "division", "amount", "latitude",
+            "longitude"
+        ]].copy()
+        display_df["coordinates"] = (
+            format_decimal_column(display_df["latitude"], 6) + ", " +
+            format_decimal_column(display_df["longitude"], 6))
+
+        st.dataframe(display_df,
+                     use_container_width=True,
+                     hide_index=True,
+                     column_config=currency_columns("amount"))
+
+    st.markdown("---")
+    st.subheader("🔍 Search by Transaction ID")
+
+    trans_ids = transactions["id"].tolist()
+    selected_id = st.selectbox("Select Transaction", trans_ids)
+
+    trans = get_transaction(selected_id) if selected_id else None
+    if trans is not None:
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"**Transaction ID:** {trans['id']}")
+            st.markdown(f"**Student:** {trans['name']}")
+            st.markdown(f"**Class:** {trans['class']}")
+            st.markdown(f"**Division:** {trans['division']}")
+            st.markdown(f"**Amount:** {format_currency(trans['amount'])}")
+
+        with col2:
+            st.markdown(f"**Date/Time:** {trans['datetime']}")
+            lat = trans['latitude']
+            lon = trans['longitude']
+            if pd.notna(lat) and pd.notna(lon):
+                st.markdown(f"**Latitude:** {lat}")
+                st.markdown(f"**Longitude:** {lon}")
+                st.markdown(
+                    f"[View on Google Maps](https://www.google.com/maps?q={lat},{lon})"
+                )
+            else:
+                st.markdown("**Location:** Not captured")
@@ -0,0 +1,425 @@
+import contextlib
+import contextvars
+import functools
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+
+# Lightweight timing for data_utils and the app's render functions. Calls are
+# accumulated process-wide and, while a page rerun is being tracked with
+# rerun(), also into that rerun's record. Recent reruns feed the render
+# latency percentiles on the Diagnostics page and in the Prometheus dump.
+
+# Directory for files written at runtime (metrics dump, profiles) unless
+# their own variables say otherwise.
+RUNTIME_FOLDER = os.environ.get("FINANCE_RUNTIME_DIR", ".runtime")
+# Prometheus text dump of the counters below; empty disables it.
+METRICS_FILE = os.environ.get("FINANCE_METRICS_FILE",
+                              os.path.join(RUNTIME_FOLDER, "metrics.prom"))
+# Minimum seconds between two rewrites of METRICS_FILE.
+METRICS_DUMP_INTERVAL = 15
+# Finished reruns kept for the latency percentiles and the rerun list.
+RECENT_RERUNS = 500
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+# Profiles of single reruns, as collapsed stacks ("a;b;c <samples>" per
+# line, readable by speedscope and flamegraph.pl). Only the newest
+# PROFILE_KEEP files are kept.
+PROFILES_FOLDER = os.environ.get("FINANCE_PROFILES_DIR",
+                                 os.path.join(RUNTIME_FOLDER, "profiles"))
+PROFILE_KEEP = 50
+PROFILE_INTERVAL = 0.002
+PROFILE_SUFFIX = ".folded"
+
+_lock = threading.Lock()
+_functions = {}
+_bytes = {"read": 0, "written": 0}
+_cache_events = {}
+_render_totals = {}
+_reruns = deque(maxlen=RECENT_RERUNS)
+_last_dump = 0.0
+_current_rerun = contextvars.ContextVar("finance_rerun", default=None)
+# time.time() until which every session's reruns are profiled.
+_profile_all_until = 0.0
+
+
+def _new_rerun(page):
+    return {
+        "page": page,
+        "started": time.time(),
+        "seconds": 0.0,
+        "functions": {},
+        "bytes": {"read": 0, "written": 0},
+        "cache": {}
+    }
+
+
+def _record_call(name, category, seconds):
+    with _lock:
+        stats = _functions.setdefault(name, {
+            "category": category,
+            "calls": 0,
+            "seconds": 0.0,
+            "max_seconds": 0.0
+        })
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        if seconds > stats["max_seconds"]:
+            stats["max_seconds"] = seconds
+    record = _current_rerun.get()
+    if record is not None:
+        stats = record["functions"].setdefault(name, {
+            "category": category,
+            "calls": 0,
+            "seconds": 0.0
+        })
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+
+
+def instrumented(func=None, *, name=None, category="data"):
+    # Decorator counting and timing every call of func; usable bare or as
+    # instrumented(category="render").
+    if func is None:
+        return functools.partial(instrumented, name=name, category=category)
+    label = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record_call(label, category, time.perf_counter() - started)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def timed(name, category="data"):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_call(name, category, time.perf_counter() - started)
+
+
+def record_bytes(direction, count):
+    # direction is "read" or "written".
+    with _lock:
+        _bytes[direction] += count
+    record = _current_rerun.get()
+    if record is not None:
+        record["bytes"][direction] += count
+
+
+def record_cache(event):
+    with _lock:
+        _cache_events[event] = _cache_events.get(event, 0) + 1
+    record = _current_rerun.get()
+    if record is not None:
+        record["cache"][event] = record["cache"].get(event, 0) + 1
+
+
+@contextlib.contextmanager
+def rerun(page):
+    # Tracks one page rerun; yields its record, which is complete (and
+    # listed in recent_reruns()) once the block exits. The caller may update
+    # record["page"] if the page changes while the rerun is running.
+    record = _new_rerun(page)
+    token = _current_rerun.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - started
+        _current_rerun.reset(token)
+        with _lock:
+            _reruns.append(record)
+            totals = _render_totals.setdefault(record["page"], {
+                "count": 0,
+                "seconds": 0.0
+            })
+            totals["count"] += 1
+            totals["seconds"] += record["seconds"]
+        _maybe_dump()
+
+
+def recent_reruns():
+    with _lock:
+        return list(_reruns)
+
+
+def function_stats():
+    with _lock:
+        return {name: dict(stats) for name, stats in _functions.items()}
+
+
+def io_stats():
+    with _lock:
+        return {"bytes": dict(_bytes), "cache": dict(_cache_events)}
+
+
+def _quantile(sorted_values, q):
+    # Nearest-rank quantile of an already sorted, non-empty list.
+    rank = math.ceil(q * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def render_latency():
+    # Per page: reruns seen in total and quantiles over the recent ones.
+    with _lock:
+        durations = {}
+        for record in _reruns:
+            durations.setdefault(record["page"], []).append(record["seconds"])
+        totals = {page: dict(t) for page, t in _render_totals.items()}
+    latency = {}
+    for page, total in totals.items():
+        values = sorted(durations.get(page, []))
+        latency[page] = {
+            "count": total["count"],
+            "seconds": total["seconds"],
+            "quantiles": {q: _quantile(values, q)
+                          for q in LATENCY_QUANTILES} if values else {}
+        }
+    return latency
+
+
+def _escape(value):
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def prometheus_text():
+    lines = [
+        "# HELP finance_function_calls_total Calls of instrumented functions.",
+        "# TYPE finance_function_calls_total counter"
+    ]
+    functions = function_stats()
+    for name, stats in sorted(functions.items()):
+        lines.append(f'finance_function_calls_total{{function="'
+                     f'{_escape(name)}",category="{stats["category"]}"}} '
+                     f'{stats["calls"]}')
+    lines += [
+        "# HELP finance_function_seconds_total Time spent in instrumented "
+        "functions, including nested calls.",
+        "# TYPE finance_function_seconds_total counter"
+    ]
+    for name, stats in sorted(functions.items()):
+        lines.append(f'finance_function_seconds_total{{function="'
+                     f'{_escape(name)}",category="{stats["category"]}"}} '
+                     f'{stats["seconds"]:.6f}')
+
+    io = io_stats()
+    lines += [
+        "# HELP finance_io_bytes_total Bytes read and written by the ledger "
+        "storage.", "# TYPE finance_io_bytes_total counter"
+    ]
+    for direction, count in sorted(io["bytes"].items()):
+        lines.append(
+            f'finance_io_bytes_total{{direction="{direction}"}} {count}')
+    lines += [
+        "# HELP finance_cache_events_total Ledger cache lookups by outcome.",
+        "# TYPE finance_cache_events_total counter"
+    ]
+    for event, count in sorted(io["cache"].items()):
+        lines.append(
+            f'finance_cache_events_total{{event="{_escape(event)}"}} {count}')
+
+    lines += [
+        "# HELP finance_render_seconds Page rerun time; quantiles over the "
+        "most recent reruns.", "# TYPE finance_render_seconds summary"
+    ]
+    for page, stats in sorted(render_latency().items()):
+        label = f'page="{_escape(page)}"'
+        for q, value in stats["quantiles"].items():
+            lines.append(f'finance_render_seconds{{{label},quantile="{q}"}} '
+                         f'{value:.6f}')
+        lines.append(f"finance_render_seconds_sum{{{label}}} "
+                     f"{stats['seconds']:.6f}")
+        lines.append(f"finance_render_seconds_count{{{label}}} "
+                     f"{stats['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=METRICS_FILE):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".",
+                                    suffix=".tmp",
+                                    dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(prometheus_text())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _maybe_dump():
+    global _last_dump
+    if not METRICS_FILE:
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _last_dump < METRICS_DUMP_INTERVAL:
+            return
+        _last_dump = now
+    try:
+        write_prometheus(METRICS_FILE)
+    except OSError:
+        # Metrics are best effort; never fail a page over them.
+        pass
+
+
+class _StackSampler(threading.Thread):
+    # Samples the Python stack of one thread every interval seconds,
+    # counting each distinct stack below (and including) root_frame.
+
+    def __init__(self, thread_id, root_frame, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root_code = root_frame.f_code
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} "
+                             f"({os.path.basename(code.co_filename)}:"
+                             f"{code.co_firstlineno})".replace(";", ":"))
+                if code is self.root_code:
+                    break
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _profile_slug(label):
+    return re.sub(r"[^A-Za-z0-9]+", "-", label).strip("-") or "rerun"
+
+
+def profiled(label, interval=PROFILE_INTERVAL):
+    # Samples the calling thread while the block runs and writes the stacks
+    # to PROFILES_FOLDER as <time>_<label>_<ms>ms.folded. Sampled stacks stop
+    # at the function that called profiled().
+    return _profiled(label, interval, sys._getframe(1))
+
+
+@contextlib.contextmanager
+def _profiled(label, interval, root_frame):
+    sampler = _StackSampler(threading.get_ident(), root_frame, interval)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            _write_profile(label, elapsed_ms, sampler.stacks)
+        except OSError:
+            pass
+
+
+def _write_profile(label, elapsed_ms, stacks):
+    os.makedirs(PROFILES_FOLDER, exist_ok=True)
+    now = time.time()
+    stamp = (time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) +
+             f"-{int(now * 1000) % 1000:03d}")
+    name = (f"{stamp}_{_profile_slug(label)}_{elapsed_ms:.0f}ms"
+            f"{PROFILE_SUFFIX}")
+    path = os.path.join(PROFILES_FOLDER, name)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f"{stack} {count}\n")
+    for old in list_profiles()[PROFILE_KEEP:]:
+        try:
+            os.remove(old["path"])
+        except OSError:
+            pass
+    return path
+
+
+def list_profiles():
+    # Saved profiles, newest first.
+    try:
+        names = os.listdir(PROFILES_FOLDER)
+    except OSError:
+        return []
+    profiles = []
+    for name in names:
+        match = re.fullmatch(
+            r"(\d{8}-\d{6}-\d{3})_(.+)_(\d+)ms" + re.escape(PROFILE_SUFFIX),
+            name)
+        if match is None:
+            continue
+        path = os.path.join(PROFILES_FOLDER, name)
+        profiles.append({
+            "path": path,
+            "name": name,
+            "created": match.group(1),
+            "label": match.group(2),
+            "duration_ms": int(match.group(3)),
+            "size": os.path.getsize(path)
+        })
+    profiles.sort(key=lambda p: p["created"], reverse=True)
+    return profiles
+
+
+def profile_hotspots(path, limit=15):
+    # (frame, self samples, total samples) for the frames with the most
+    # self samples in a collapsed-stack profile.
+    own = {}
+    total = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            frames = stack.split(";")
+            count = int(count)
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for frame in set(frames):
+                total[frame] = total.get(frame, 0) + count
+    ranked = sorted(own.items(), key=lambda item: item[1], reverse=True)
+    return [(frame, samples, total[frame])
+            for frame, samples in ranked[:limit]]
+
+
+def profile_all_sessions(minutes):
+    # Profile every session's reruns for the next minutes (0 stops).
+    global _profile_all_until
+    _profile_all_until = time.time() + minutes * 60 if minutes else 0.0
+
+
+def profiling_all_until():
+    # time.time() at which profiling of all sessions stops, or None.
+    return _profile_all_until if _profile_all_until > time.time() else None
+
+
+def reset():
+    global _last_dump
+    with _lock:
+        _functions.clear()
+        _bytes.update(read=0, written=0)
+        _cache_events.clear()
+        _render_totals.clear()
+        _reruns.clear()
+        _last_dump = 0.0
@@ -0,0 +1,481 @@
+import pandas as pd
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+import data_utils
+
+# SQLite implementation of data_utils.STORAGE_BACKEND_API. Selected with
+# FINANCE_STORAGE_BACKEND=sqlite; the database lives at FINANCE_SQLITE_PATH.
+DATABASE_FILE = os.environ.get("FINANCE_SQLITE_PATH", "finance.db")
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS divisions (
+    division TEXT PRIMARY KEY,
+    starting_balance REAL NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    datetime TEXT NOT NULL,
+    name TEXT,
+    class TEXT,
+    division TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    description TEXT,
+    receipt_path TEXT,
+    latitude REAL,
+    longitude REAL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_id ON transactions(id);
+CREATE INDEX IF NOT EXISTS idx_transactions_division
+    ON transactions(division, type, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_datetime
+    ON transactions(datetime);
+CREATE INDEX IF NOT EXISTS idx_transactions_datetime_id
+    ON transactions(datetime, id);
+CREATE INDEX IF NOT EXISTS idx_transactions_name ON transactions(name);
+"""
+
+# Per-division credit/debit aggregates, joined onto divisions by the
+# summary queries below.
+DIVISION_TOTALS = """
+SELECT division,
+       COALESCE(SUM(CASE WHEN type = 'credit' THEN amount END), 0.0) AS credits,
+       COALESCE(SUM(CASE WHEN type = 'debit' THEN amount END), 0.0) AS debits,
+       SUM(type = 'debit') AS debit_count,
+       COUNT(*) AS transaction_count
+FROM transactions
+"""
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated_paths = set()
+
+
+def _connect():
+    path = os.path.abspath(DATABASE_FILE)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[path] = conn
+    return conn
+
+
+@contextmanager
+def _write_transaction():
+    # BEGIN IMMEDIATE takes the database write lock up front, so checks made
+    # inside the block stay valid until COMMIT.
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _to_float_or_none(value):
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def _to_text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+
+def _transaction_params(row):
+    return (_to_text(row["id"]), _to_text(row["datetime"]),
+            _to_text(row["name"]), _to_text(row["class"]),
+            _to_text(row["division"]), _to_text(row["type"]),
+            float(row["amount"]), _to_text(row["description"]),
+            _to_text(row.get("receipt_path", "")),
+            _to_float_or_none(row.get("latitude")),
+            _to_float_or_none(row.get("longitude")))
+
+
+INSERT_TRANSACTION = ("INSERT INTO transactions (" + ", ".join(
+    f'"{col}"' for col in data_utils.TRANSACTIONS_COLUMNS) + ") VALUES (" +
+                      ", ".join("?" for _ in data_utils.TRANSACTIONS_COLUMNS) +
+                      ")")
+
+
+def migrate_storage():
+    # Called on every rerun; setting user_version takes the database write
+    # lock, so the schema is applied once per database file and process.
+    path = os.path.abspath(DATABASE_FILE)
+    if path in _migrated_paths:
+        return SCHEMA_VERSION
+    with _migrate_lock:
+        if path not in _migrated_paths:
+            data_utils.ensure_receipts_folder()
+            conn = _connect()
+            conn.executescript(SCHEMA)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            _migrated_paths.add(path)
+    return SCHEMA_VERSION
+
+
+def _query_transactions(where="", params=(), columns=None, order="seq", limit=None):
+    columns = list(columns or data_utils.TRANSACTIONS_COLUMNS)
+    select = ", ".join(f'"{col}"' for col in columns)
+    if limit is not None:
+        order += f" LIMIT {int(limit)}"
+    df = pd.read_sql_query(
+        f"SELECT {select} FROM transactions {where} ORDER BY {order}",
+        _connect(),
+        params=params)
+    if df.empty:
+        df = pd.DataFrame(columns=columns)
+    return data_utils.coerce_transaction_dtypes(df)
+
+
+def load_transactions(columns=None):
+    return _query_transactions(columns=columns)
+
+
+def save_transactions(df):
+    with _write_transaction() as conn:
+        conn.execute("DELETE FROM transactions")
+        conn.executemany(INSERT_TRANSACTION,
+                         (_transaction_params(row)
+                          for row in df.to_dict("records")))
+
+
+def load_divisions():
+    df = pd.read_sql_query(
+        "SELECT division, starting_balance FROM divisions ORDER BY position",
+        _connect())
+    if df.empty:
+        return pd.DataFrame(columns=data_utils.DIVISIONS_COLUMNS)
+    return df
+
+
+def save_divisions(df):
+    with _write_transaction() as conn:
+        conn.execute("DELETE FROM divisions")
+        conn.executemany(
+            "INSERT INTO divisions (division, starting_balance, position) "
+            "VALUES (?, ?, ?)",
+            ((str(row["division"]), float(row["starting_balance"]), position)
+             for position, row in enumerate(df.to_dict("records"))))
+
+
+def _balance(conn, division_name):
+    row = conn.execute(
+        "SELECT d.starting_balance + COALESCE(t.credits, 0.0) "
+        "- COALESCE(t.debits, 0.0) "
+        f"FROM divisions d LEFT JOIN ({DIVISION_TOTALS} WHERE division = ?) t "
+        "ON t.division = d.division WHERE d.division = ?",
+        (str(division_name), str(division_name))).fetchone()
+    return None if row is None else row[0]
+
+
+def reserve_and_commit(new_row, validate_balance=False):
+    with _write_transaction() as conn:
+        balance = _balance(conn, new_row["division"])
+        if balance is None:
+            return None
+        if (validate_balance and new_row["type"] == "debit"
+                and float(new_row["amount"]) > balance):
+            return "INSUFFICIENT_FUNDS"
+        conn.execute(INSERT_TRANSACTION, _transaction_params(new_row))
+    return new_row["id"]
+
+
+def get_transaction(trans_id):
+    df = _query_transactions("WHERE id = ?", (trans_id, ))
+    if df.empty:
+        return None
+    return df.iloc[0].to_dict()
+
+
+def _filter_clauses(trans_type=None, division=None, name=None):
+    clauses = []
+    params = []
+    for col, value in (("type", trans_type), ("division", division),
+                       ("name", name)):
+        if value is not None:
+            clauses.append(f'"{col}" = ?')
+            params.append(_to_text(value))
+    return clauses, params
+
+
+def count_transactions(trans_type=None, division=None, name=None):
+    clauses, params = _filter_clauses(trans_type, division, name)
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    return _connect().execute(f"SELECT COUNT(*) FROM transactions {where}",
+                              params).fetchone()[0]
+
+
+def get_transactions_page(page_size=20, cursor=None, sort_by="datetime", descending=True, trans_type=None, division=None, name=None):
+    if sort_by not in data_utils.TRANSACTION_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort transactions by {sort_by!r}")
+    clauses, params = _filter_clauses(trans_type, division, name)
+    if cursor is not None:
+        value, last_id = cursor
+        value = float(value) if sort_by == "amount" else _to_text(value)
+        clauses.append(f'("{sort_by}", id) {"<" if descending else ">"} (?, ?)')
+        params += [value, last_id]
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    direction = "DESC" if descending else "ASC"
+    page = _query_transactions(where, params,
+                               order=f'"{sort_by}" {direction}, id {direction}',
+                               limit=page_size + 1)
+    next_cursor = None
+    if len(page) > page_size:
+        page = page.iloc[:page_size]
+        last = _connect().execute(
+            f'SELECT "{sort_by}", id FROM transactions WHERE id = ?',
+            (page["id"].iloc[-1], )).fetchone()
+        next_cursor = (last[0], last[1])
+    return page, next_cursor
+
+
+def update_transaction(trans_id, name, student_class, division, trans_type, amount, description, receipt_path=None, latitude=None, longitude=None):
+    fields = {
+        "name": _to_text(name),
+        "class": _to_text(student_class),
+        "division": _to_text(division),
+        "type": _to_text(trans_type),
+        "amount": float(amount),
+        "description": _to_text(description)
+    }
+    if receipt_path is not None:
+        fields["receipt_path"] = _to_text(receipt_path)
+    if latitude is not None:
+        fields["latitude"] = _to_float_or_none(latitude)
+    if longitude is not None:
+        fields["longitude"] = _to_float_or_none(longitude)
+    assignments = ", ".join(f'"{col}" = ?' for col in fields)
+    with _write_transaction() as conn:
+        cursor = conn.execute(
+            f"UPDATE transactions SET {assignments} WHERE id = ?",
+            (*fields.values(), trans_id))
+    return cursor.rowcount > 0
+
+
+def delete_transaction(trans_id):
+    with _write_transaction() as conn:
+        cursor = conn.execute("DELETE FROM transactions WHERE id = ?",
+                              (trans_id, ))
+    return cursor.rowcount > 0
+
+
+def add_division(division_name, starting_balance):
+    with _write_transaction() as conn:
+        if conn.execute("SELECT 1 FROM divisions WHERE division = ?",
+                        (str(division_name), )).fetchone():
+            return False
+        conn.execute(
+            "INSERT INTO divisions (division, starting_balance, position) "
+            "SELECT ?, ?, COALESCE(MAX(position), -1) + 1 FROM divisions",
+            (str(division_name), float(starting_balance)))
+    return True
+
+
+def update_division(division_name, new_starting_balance):
+    with _write_transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE divisions SET starting_balance = ? WHERE division = ?",
+            (float(new_starting_balance), str(division_name)))
+    return cursor.rowcount > 0
+
+
+def delete_division(division_name):
+    with _write_transaction() as conn:
+        cursor = conn.execute("DELETE FROM divisions WHERE division = ?",
+                              (str(division_name), ))
+    return cursor.rowcount > 0
+
+
+def division_exists(division_name):
+    return _connect().execute("SELECT 1 FROM divisions WHERE division = ?",
+                              (str(division_name), )).fetchone() is not None
+
+
+def get_division_list():
+    return [
+        row[0] for row in _connect().execute(
+            "SELECT division FROM divisions ORDER BY position")
+    ]
+
+
+def get_division_balance(division_name):
+    return _balance(_connect(), division_name)
+
+
+def calculate_financials():
+    conn = _connect()
+    total_starting_balance = conn.execute(
+        "SELECT COALESCE(SUM(starting_balance), 0.0) FROM divisions").fetchone(
+        )[0]
+    credits, debits = conn.execute(
+        "SELECT COALESCE(SUM(CASE WHEN type = 'credit' THEN amount END), 0.0), "
+        "COALESCE(SUM(CASE WHEN type = 'debit' THEN amount END), 0.0) "
+        "FROM transactions").fetchone()
+
+    total_credited = total_starting_balance + credits
+    remaining_balance = total_credited - debits
+
+    return {
+        "total_credited": total_credited,
+        "total_spent": debits,
+        "remaining_balance": remaining_balance,
+        "credits_added": credits
+    }
+
+
+def _division_rows(where="", params=()):
+    return _connect().execute(
+        "SELECT d.division, d.starting_balance, COALESCE(t.credits, 0.0), "
+        "COALESCE(t.debits, 0.0), COALESCE(t.debit_count, 0), "
+        "COALESCE(t.transaction_count, 0) "
+        f"FROM divisions d LEFT JOIN ({DIVISION_TOTALS} GROUP BY division) t "
+        f"ON t.division = d.division {where} ORDER BY d.position",
+        params).fetchall()
+
+
+def calculate_division_summary():
+    summary = []
+    for div_name, starting_bal, credits, debits, _, _ in _division_rows():
+        total_funds = starting_bal + credits
+        remaining = total_funds - debits
+
+        summary.append({
+            "Division": div_name,
+            "Starting Balance": starting_bal,
+            "Credits Added": credits,
+            "Total Spent": debits,
+            "Remaining Balance": remaining
+        })
+
+    return pd.DataFrame(summary)
+
+
+def get_division_transactions(division_name):
+    return _query_transactions("WHERE division = ?", (str(division_name), ))
+
+
+def get_division_stats(division_name):
+    rows = _division_rows("WHERE d.division = ?", (str(division_name), ))
+    if not rows:
+        return None
+    _, starting_bal, credits, debits, debit_count, transaction_count = rows[0]
+
+    return {
+        "starting_balance": starting_bal,
+        "credits_added": credits,
+        "total_spent": debits,
+        "remaining_balance": starting_bal + credits - debits,
+        "transaction_count": transaction_count,
+        "avg_expense": debits / debit_count if debit_count > 0 else 0
+    }
+
+
+def get_daily_totals(division=None):
+    where, params = "", ()
+    if division is not None:
+        where, params = "WHERE division = ?", (str(division), )
+    df = pd.read_sql_query(
+        "SELECT substr(datetime, 1, 10) AS date, type, SUM(amount) AS amount, "
+        f"COUNT(*) AS count FROM transactions {where} "
+        "GROUP BY date, type ORDER BY date, type",
+        _connect(),
+        params=params)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
+    return df.dropna(subset=["date"]).reset_index(drop=True)
+
+
+def get_daily_location_counts():
+    df = pd.read_sql_query(
+        "SELECT substr(datetime, 1, 10) AS date, COUNT(*) AS count "
+        "FROM transactions "
+        "WHERE latitude IS NOT NULL AND longitude IS NOT NULL "
+        "GROUP BY date ORDER BY date", _connect())
+    df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
+    return df.dropna(subset=["date"]).reset_index(drop=True)
+
+
+def get_top_spenders(k=10, division=None):
+    where, params = "WHERE type = 'debit'", ()
+    if division is not None:
+        where, params = where + " AND division = ?", (str(division), )
+    return pd.read_sql_query(
+        f"SELECT name, SUM(amount) AS amount FROM transactions {where} "
+        "GROUP BY name ORDER BY amount DESC LIMIT ?",
+        _connect(),
+        params=params + (int(k), ))
+
+
+def get_recent_transactions(n=5, division=None):
+    where, params = "", ()
+    if division is not None:
+        where, params = "WHERE division = ?", (str(division), )
+    return _query_transactions(where, params, order="datetime DESC, id DESC",
+                               limit=n)
+
+
+def get_dashboard_data(recent_count=5):
+    conn = _connect()
+    # One read transaction, so every figure comes from the same snapshot.
+    conn.execute("BEGIN")
+    try:
+        spending = pd.read_sql_query(
+            "SELECT division, SUM(amount) AS amount FROM transactions "
+            "WHERE type = 'debit' GROUP BY division ORDER BY division", conn)
+        transaction_count = conn.execute(
+            "SELECT COUNT(*) FROM transactions").fetchone()[0]
+        data = {
+            "financials": calculate_financials(),
+            "division_summary": calculate_division_summary(),
+            "spending_by_division": spending,
+            "transaction_count": transaction_count,
+            "recent": get_recent_transactions(recent_count)
+        }
+    finally:
+        conn.execute("COMMIT")
+    return data
+
+
+def import_csv_ledger(replace=False):
+    migrate_storage()
+    transactions, divisions = data_utils.read_csv_ledger()
+    conn = _connect()
+    existing = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM transactions) + "
+        "(SELECT COUNT(*) FROM divisions)").fetchone()[0]
+    if existing and not replace:
+        raise ValueError(f"{DATABASE_FILE} already holds data; "
+                         "pass replace=True to overwrite it")
+    save_divisions(divisions)
+    save_transactions(transactions)
+    return len(transactions), len(divisions)
+
+
+if __name__ == "__main__":
+    # One-shot import: python sqlite_store.py [--replace]
+    imported = import_csv_ledger(replace="--replace" in sys.argv[1:])
+    print(f"Imported {imported[0]} transactions and {imported[1]} divisions "
+          f"into {DATABASE_FILE}")
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geo_utils  # noqa: E402
+
+
+def _brute_force_labels(points, radius_m):
+    # Connected groups of points within radius_m, from every pairwise
+    # distance; numbered like proximity_clusters with min_points=2.
+    lat = points["lat"].to_numpy(dtype="float64")
+    lon = points["lon"].to_numpy(dtype="float64")
+    near = geo_utils.haversine_m(lat[:, None], lon[:, None], lat[None, :],
+                                 lon[None, :]) <= radius_m
+    left, right = np.nonzero(near)
+    labels = geo_utils._connected_labels(len(points), left, right)
+    roots, inverse, sizes = np.unique(labels,
+                                      return_inverse=True,
+                                      return_counts=True)
+    ranked = np.argsort(-sizes, kind="stable")
+    numbering = np.full(len(roots), -1, dtype=np.int64)
+    keep = ranked[sizes[ranked] >= 2]
+    numbering[keep] = np.arange(len(keep))
+    return numbering[inverse.ravel()]
+
+
+def _same_clusters(a, b):
+    pairs = set(zip(a.tolist(), b.tolist()))
+    return (np.array_equal(a < 0, b < 0) and
+            len(pairs) == len(set(a.tolist())) == len(set(b.tolist())))
+
+
+def test_pair_across_the_antimeridian():
+    # About 11 m apart, on either side of longitude 180.
+    points = pd.DataFrame({"lat": [10.0, 10.0], "lon": [179.99995, -179.99995]})
+    labels = geo_utils.proximity_clusters(points, radius_m=50)
+    assert labels.tolist() == [0, 0]
+
+
+def test_pair_near_the_pole():
+    # Above 89 degrees the cells are narrowest; this pair is about 970 m
+    # apart across many longitude cells.
+    points = pd.DataFrame({"lat": [89.995, 89.99], "lon": [0.0, 60.0]})
+    distance = geo_utils.haversine_m(89.995, 0.0, 89.99, 60.0)
+    assert distance < 2000
+    labels = geo_utils.proximity_clusters(points, radius_m=2000)
+    assert labels.tolist() == [0, 0]
+
+
+def test_matches_brute_force_at_high_latitudes():
+    rng = np.random.default_rng(7)
+    for _ in range(60):
+        count = int(rng.integers(2, 40))
+        center = rng.uniform(80, 90)
+        points = pd.DataFrame({
+            "lat": np.minimum(center + rng.normal(0, 0.02, count), 90.0),
+            "lon": rng.uniform(-180, 180, count)
+        })
+        radius_m = float(rng.choice([50, 500, 2000]))
+        labels = geo_utils.proximity_clusters(points, radius_m=radius_m)
+        assert _same_clusters(labels, _brute_force_labels(points, radius_m))
+
+
+def test_matches_brute_force_around_the_antimeridian():
+    rng = np.random.default_rng(11)
+    for _ in range(60):
+        count = int(rng.integers(2, 40))
+        points = pd.DataFrame({
+            "lat": rng.uniform(-70, 70) + rng.normal(0, 0.002, count),
+            "lon": (180 + rng.normal(0, 0.003, count) + 180) % 360 - 180
+        })
+        radius_m = float(rng.choice([20, 100, 400]))
+        labels = geo_utils.proximity_clusters(points, radius_m=radius_m)
+        assert _same_clusters(labels, _brute_force_labels(points, radius_m))
@@ -0,0 +1,13 @@
+import streamlit as st
+
+# Streamlit helpers shared by app.py and the page modules.
+
+# Amount columns in tables are formatted by the browser rather than turned
+# into strings row by row.
+CURRENCY_COLUMN = st.column_config.NumberColumn(format="AED %,.2f")
+
+
+def currency_columns(*columns):
+    # column_config for st.dataframe showing the given numeric columns as
+    # currency; the values stay numbers, so they also sort as numbers.
+    return {col: CURRENCY_COLUMN for col in columns}